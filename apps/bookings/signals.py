@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.listings.availability import sync_booking_nights
+from apps.listings.search_cache import invalidate_listing_search
+
+from .models import Booking
+
+
+@receiver(post_save, sender=Booking)
+def update_availability_on_booking_save(sender, instance: Booking, **kwargs):
+    sync_booking_nights(instance)
+    invalidate_listing_search(instance.listing_id)
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_search_on_booking_delete(sender, instance: Booking, **kwargs):
+    invalidate_listing_search(instance.listing_id)
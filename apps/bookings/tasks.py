@@ -5,6 +5,8 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.utils import timezone
 
+from apps.listings.availability import release_booking_nights
+
 from .models import Booking
 
 
@@ -106,6 +108,7 @@ def complete_past_bookings():
     qs = Booking.objects.filter(status=Booking.Status.APPROVED, date_to__lte=today)
     ids = list(qs.values_list("id", flat=True))
     updated = qs.update(status=Booking.Status.COMPLETED)
+    release_booking_nights(ids)
     for bid in ids:
         try:
             send_booking_completed_email.delay(bid)
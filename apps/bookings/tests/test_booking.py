@@ -71,3 +71,29 @@ def test_booking_overlap_validation(listing, tenant):
         date_to__gt=date(2026, 8, 2),
     ).exists()
     assert overlap
+
+
+@pytest.mark.django_db
+def test_date_search_uses_occupied_nights(listing, tenant):
+    from apps.listings.models import ListingBlockedDate
+    from apps.listings.services import base_listing_queryset, filter_listings
+
+    params = {"date_from": "2026-09-01", "date_to": "2026-09-05"}
+    booking = Booking.objects.create(
+        listing=listing,
+        tenant=tenant,
+        date_from=date(2026, 9, 4),
+        date_to=date(2026, 9, 6),
+        status=Booking.Status.PENDING,
+    )
+    assert not filter_listings(base_listing_queryset(), params).exists()
+
+    booking.status = Booking.Status.REJECTED
+    booking.save()
+    assert filter_listings(base_listing_queryset(), params).exists()
+
+    blocked = ListingBlockedDate.objects.create(listing=listing, date=date(2026, 9, 1))
+    assert not filter_listings(base_listing_queryset(), params).exists()
+
+    blocked.delete()
+    assert filter_listings(base_listing_queryset(), params).exists()
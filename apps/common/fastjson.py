@@ -0,0 +1,31 @@
+"""JSON encoding for hot endpoints: orjson when installed, stdlib ``json`` otherwise.
+
+Both produce compact UTF-8 output (no ``\\uXXXX`` escapes) and fall back to
+``DjangoJSONEncoder`` for types neither handles natively, e.g. ``Decimal``.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+_fallback_default = DjangoJSONEncoder().default
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_fallback_default)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in for ``JsonResponse`` (dict payloads only) encoded with :func:`dumps`."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
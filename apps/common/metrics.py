@@ -0,0 +1,30 @@
+"""Simple counters kept in the Django cache so every worker sees the same totals."""
+
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "metrics:"
+
+
+def incr(name: str, delta: int = 1) -> None:
+    key = PREFIX + name
+    try:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, delta)
+    except Exception:
+        logger.warning("metrics: failed to increment %s", name, exc_info=True)
+
+
+def get_counters(*names: str) -> dict:
+    try:
+        values = cache.get_many([PREFIX + n for n in names])
+    except Exception:
+        logger.warning("metrics: failed to read counters", exc_info=True)
+        values = {}
+    return {n: int(values.get(PREFIX + n) or 0) for n in names}
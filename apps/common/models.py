@@ -1,6 +1,11 @@
 from django.db import models
+from django.dispatch import Signal
 from django.utils import timezone
 
+# Sent with ``sender=<model>, pks=[...], deleted=bool`` after a queryset-level
+# soft delete or restore; these run as UPDATEs, so no save signals fire.
+bulk_soft_delete_changed = Signal()
+
 
 class SoftDeleteQuerySet(models.QuerySet):
     def alive(self):
@@ -10,20 +15,27 @@ class SoftDeleteQuerySet(models.QuerySet):
         return self.filter(is_deleted=True)
 
     def delete(self):
-
-        return self.filter(is_deleted=False).update(
+        pks = list(self.filter(is_deleted=False).values_list("pk", flat=True))
+        updated = self.model._base_manager.filter(pk__in=pks, is_deleted=False).update(
             is_deleted=True,
             deleted_at=timezone.now(),
         )
+        if pks:
+            bulk_soft_delete_changed.send(sender=self.model, pks=pks, deleted=True)
+        return updated
 
     def hard_delete(self):
         return super().delete()
 
     def restore(self):
-         return self.filter(is_deleted=True).update(
+        pks = list(self.filter(is_deleted=True).values_list("pk", flat=True))
+        updated = self.model._base_manager.filter(pk__in=pks, is_deleted=True).update(
             is_deleted=False,
             deleted_at=None,
         )
+        if pks:
+            bulk_soft_delete_changed.send(sender=self.model, pks=pks, deleted=False)
+        return updated
 
 
 class SoftDeleteManager(models.Manager):
@@ -1,8 +1,95 @@
+"""Process-wide Redis client for the app's own keys (counters, buffers, streams).
+
+``get_redis_client`` returns one client per process and ``REDIS_URL``,
+backed by a ``ConnectionPool`` with connect/read timeouts and a PING
+health check on connections idle longer than
+``REDIS_HEALTH_CHECK_INTERVAL``. Clients are keyed by pid and dropped in
+a forked child, so gunicorn and Celery prefork workers open their own
+sockets instead of sharing their parent's.
+
+Every command and every pipeline ``execute`` is timed and failures are
+counted in ``redis_metrics``, which serves them at ``/metrics/``.
+"""
+
 import os
+import threading
+import time
+
 import redis
+from django.conf import settings
+from redis.client import Pipeline
+
+from . import redis_metrics
+
+DEFAULT_URL = "redis://127.0.0.1:6379/0"
+
+
+class InstrumentedPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except redis.RedisError as exc:
+            redis_metrics.record_error("PIPELINE", exc)
+            raise
+        finally:
+            redis_metrics.observe("PIPELINE", time.perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        except redis.RedisError as exc:
+            redis_metrics.record_error(args[0], exc)
+            raise
+        finally:
+            redis_metrics.observe(args[0], time.perf_counter() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _after_fork() -> None:
+    global _clients_lock
+    # The parent's sockets stay with the parent: forget them without closing.
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _create_client(url) -> InstrumentedRedis:
+    pool = redis.ConnectionPool.from_url(
+        url,
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    return InstrumentedRedis(connection_pool=pool)
+
 
+def get_redis_client() -> InstrumentedRedis:
+    url = os.getenv("REDIS_URL", DEFAULT_URL)
+    key = (os.getpid(), url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _create_client(url)
+    return client
 
-def get_redis_client() -> redis.Redis:
 
-    url = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
-    return redis.Redis.from_url(url, decode_responses=True)
+def get_pipeline(transaction=False) -> InstrumentedPipeline:
+    """A pipeline on the shared pool; non-transactional unless asked for MULTI/EXEC."""
+    return get_redis_client().pipeline(transaction=transaction)
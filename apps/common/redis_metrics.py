@@ -0,0 +1,193 @@
+"""Latency histograms and error counters of the app's Redis commands.
+
+Each process accumulates observations in memory (a lock and a few dict
+updates per command) and adds them to counters in the cache's Redis every
+``FLUSH_INTERVAL`` seconds: one pipeline of INCRBY, plus SADD of the series
+names to a set, so the totals cover every web and Celery worker without a
+Redis round trip per command. ``render`` prints those totals in
+the Prometheus text format for the ``/metrics/`` endpoint.
+"""
+
+import atexit
+import bisect
+import logging
+import os
+import threading
+import time
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; one more bucket catches everything slower.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+FLUSH_INTERVAL = 10.0
+SERIES_KEY = metrics.PREFIX + "redis:series"
+
+
+def _bucket_counter(command, index) -> str:
+    return f"redis:latency:{command}:{index}"
+
+
+def _sum_counter(command) -> str:
+    return f"redis:latency_sum_us:{command}"
+
+
+def _error_counter(command, error) -> str:
+    return f"redis:errors:{command}:{error}"
+
+
+def _shared_redis():
+    """The cache's own Redis connection, or ``None`` when the cache is not django-redis."""
+    try:
+        return get_redis_connection("default")
+    except NotImplementedError:
+        return None
+
+
+def _store(series, increments) -> None:
+    raw = _shared_redis()
+    if raw is None:
+        # Local-memory cache (development, tests): one call per counter is fine.
+        known = cache.get(SERIES_KEY) or set()
+        if not series <= known:
+            cache.set(SERIES_KEY, known | series, None)
+        for name, delta in increments.items():
+            metrics.incr(name, delta)
+        return
+    try:
+        pipe = raw.pipeline(transaction=False)
+        pipe.sadd(SERIES_KEY, *series)
+        for name, delta in increments.items():
+            pipe.incrby(metrics.PREFIX + name, delta)
+        pipe.execute()
+    except Exception:
+        logger.warning("redis metrics: failed to store %d counters", len(increments), exc_info=True)
+
+
+def _load(names) -> tuple:
+    """``(series, {name: value})`` of the shared counters ``names(series)`` lists."""
+    raw = _shared_redis()
+    if raw is None:
+        series = sorted(cache.get(SERIES_KEY) or ())
+        return series, metrics.get_counters(*names(series))
+    series = sorted(s.decode() if isinstance(s, bytes) else s for s in raw.smembers(SERIES_KEY))
+    keys = names(series)
+    values = raw.mget([metrics.PREFIX + name for name in keys]) if keys else []
+    return series, {name: int(value or 0) for name, value in zip(keys, values)}
+
+
+class CommandStats:
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._sums = {}
+        self._errors = {}
+        self._last_flush = time.monotonic()
+
+    def observe(self, command, seconds) -> None:
+        with self._lock:
+            buckets = self._buckets.get(command)
+            if buckets is None:
+                buckets = self._buckets[command] = [0] * (len(BUCKETS) + 1)
+            buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self._sums[command] = self._sums.get(command, 0.0) + seconds
+            due = time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def record_error(self, command, error) -> None:
+        with self._lock:
+            self._errors[(command, error)] = self._errors.get((command, error), 0) + 1
+
+    def flush(self) -> None:
+        """Add this process' observations to the shared counters."""
+        with self._lock:
+            buckets, self._buckets = self._buckets, {}
+            sums, self._sums = self._sums, {}
+            errors, self._errors = self._errors, {}
+            self._last_flush = time.monotonic()
+        if not buckets and not errors:
+            return
+        series = {f"latency:{command}" for command in buckets}
+        series |= {f"errors:{command}:{error}" for command, error in errors}
+        increments = {}
+        for command, counts in buckets.items():
+            for index, count in enumerate(counts):
+                if count:
+                    increments[_bucket_counter(command, index)] = count
+            increments[_sum_counter(command)] = round(sums[command] * 1_000_000)
+        for (command, error), count in errors.items():
+            increments[_error_counter(command, error)] = count
+        _store(series, increments)
+
+
+stats = CommandStats()
+atexit.register(stats.flush)
+os.register_at_fork(after_in_child=stats._reset)
+
+
+def observe(command, seconds) -> None:
+    stats.observe(str(command).upper(), seconds)
+
+
+def record_error(command, exc) -> None:
+    stats.record_error(str(command).upper(), type(exc).__name__)
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _parse_series(series) -> tuple:
+    """``(commands, [(command, error), ...])`` from registered series names."""
+    commands = [s.split(":", 1)[1] for s in series if s.startswith("latency:")]
+    errors = [tuple(s.split(":", 2)[1:]) for s in series if s.startswith("errors:")]
+    return commands, errors
+
+
+def _counter_names(series) -> list:
+    commands, errors = _parse_series(series)
+    return (
+        [_bucket_counter(c, i) for c in commands for i in range(len(BUCKETS) + 1)]
+        + [_sum_counter(c) for c in commands]
+        + [_error_counter(c, e) for c, e in errors]
+    )
+
+
+def render() -> str:
+    """Shared totals in the Prometheus text exposition format."""
+    try:
+        series, values = _load(_counter_names)
+    except Exception:
+        logger.warning("redis metrics: failed to read counters", exc_info=True)
+        series, values = [], {}
+    commands, errors = _parse_series(series)
+
+    lines = [
+        "# HELP redis_command_duration_seconds Latency of Redis commands issued by the application.",
+        "# TYPE redis_command_duration_seconds histogram",
+    ]
+    for command in commands:
+        cumulative = 0
+        for index, bound in enumerate(BUCKETS + (None,)):
+            cumulative += values[_bucket_counter(command, index)]
+            le = "+Inf" if bound is None else repr(bound)
+            lines.append(f"redis_command_duration_seconds_bucket{{{_labels(command=command, le=le)}}} {cumulative}")
+        total = values[_sum_counter(command)] / 1_000_000
+        lines.append(f"redis_command_duration_seconds_sum{{{_labels(command=command)}}} {total}")
+        lines.append(f"redis_command_duration_seconds_count{{{_labels(command=command)}}} {cumulative}")
+    lines += [
+        "# HELP redis_command_errors_total Redis commands that failed, by exception class.",
+        "# TYPE redis_command_errors_total counter",
+    ]
+    for command, error in errors:
+        value = values[_error_counter(command, error)]
+        lines.append(f"redis_command_errors_total{{{_labels(command=command, error=error)}}} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from . import redis_metrics
+
+
+def _may_scrape(request) -> bool:
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape target; needs ``Authorization: Bearer $METRICS_TOKEN`` or a staff session."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    # Include what this worker has not flushed yet.
+    redis_metrics.stats.flush()
+    return HttpResponse(redis_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
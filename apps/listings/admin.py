@@ -7,9 +7,9 @@ from django.utils.html import format_html
 
 from rangefilter.filters import DateTimeRangeFilter
 
-from .models import Listing, ListingViewStat, Amenity, ListingImage, Favorite, ListingBlockedDate
+from .models import Listing, ListingViewStat, ListingDailyStat, Amenity, ListingImage, Favorite, ListingBlockedDate, ExchangeRate
 
-from django.db.models import OuterRef, Subquery, IntegerField, Value, Avg, Count, FloatField
+from django.db.models import OuterRef, Subquery, IntegerField, Value
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
@@ -64,8 +64,6 @@ class ListingAdmin(admin.ModelAdmin):
 
         qs = qs.annotate(
             _views_total=Coalesce(Subquery(subq, output_field=IntegerField()), Value(0)),
-            _avg_rating=Coalesce(Avg("reviews__rating"), Value(0.0), output_field=FloatField()),
-            _reviews_count=Count("reviews", distinct=True),
         )
 
         # if hasattr(Listing, "is_deleted"):
@@ -104,15 +102,16 @@ class ListingAdmin(admin.ModelAdmin):
         for obj in queryset:
             obj.pk = None
             obj.id = None
+            obj.reset_review_stats()
             obj.save()
 
-    @admin.display(description="Рейтинг", ordering="_avg_rating")
+    @admin.display(description="Рейтинг", ordering="avg_rating")
     def avg_rating_admin(self, obj: Listing):
-        return round(float(getattr(obj, "_avg_rating", 0.0)), 2)
+        return round(obj.avg_rating, 2)
 
-    @admin.display(description="Отзывов", ordering="_reviews_count")
+    @admin.display(description="Отзывов", ordering="reviews_count")
     def reviews_count_admin(self, obj: Listing):
-        return int(getattr(obj, "_reviews_count", 0))
+        return obj.reviews_count
 
 @admin.register(ListingViewStat)
 class ListingViewStatAdmin(admin.ModelAdmin):
@@ -127,6 +126,15 @@ class ListingViewStatAdmin(admin.ModelAdmin):
     list_select_related = ("listing",)
 
 
+@admin.register(ListingDailyStat)
+class ListingDailyStatAdmin(admin.ModelAdmin):
+    list_display = ("listing_id", "date", "views", "unique_visitors")
+    list_filter = ("date",)
+    search_fields = ("listing__id", "listing__title")
+    ordering = ("-date", "-unique_visitors")
+    list_select_related = ("listing",)
+
+
 class ListingImageInline(admin.TabularInline):
     model = ListingImage
     extra = 1
@@ -151,3 +159,9 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_display = ("user", "listing", "created_at")
     list_select_related = ("user", "listing")
 
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ("currency", "units_per_base", "updated_at")
+    readonly_fields = ("updated_at",)
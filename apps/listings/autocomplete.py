@@ -0,0 +1,130 @@
+"""Search-box suggestions from an in-process prefix trie.
+
+The trie is built from active listings' cities and countries (weighted by
+listing count) and popular search queries (weighted by how often they were
+searched). Every node keeps its own top ``TOP_K`` suggestions, so a lookup is
+a walk of ``len(prefix)`` nodes. Each process rebuilds its copy when the
+shared version key is bumped (listing changes) or after ``MAX_AGE`` seconds
+(new popular queries).
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Min
+
+from .models import Listing
+from .search_trends import top_queries
+
+VERSION_KEY = "autocomplete:version"
+MAX_AGE = 600
+TOP_K = 10
+QUERY_SOURCE_LIMIT = 1000
+
+# Ties are broken in this order.
+KIND_PRIORITY = {"city": 0, "country": 1, "query": 2}
+
+_lock = threading.Lock()
+_index = None
+
+
+def fold(text) -> str:
+    """Case-insensitive form for Latin and Cyrillic: casefold, ё → е, single spaces."""
+    return " ".join(str(text or "").split()).casefold().replace("ё", "е")
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+
+
+class PrefixIndex:
+    def __init__(self, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.root = _Node()
+
+    def add(self, label, kind, count):
+        key = fold(label)
+        if not key:
+            return
+        entry = (-count, KIND_PRIORITY[kind], label, kind)
+        # Index every word start so "york" finds "New York".
+        starts = [0] + [i + 1 for i, ch in enumerate(key) if ch == " "]
+        for start in starts:
+            node = self.root
+            for ch in key[start:]:
+                node = node.children.setdefault(ch, _Node())
+                self._offer(node, entry)
+
+    @staticmethod
+    def _offer(node, entry):
+        top = node.top
+        if any(e[2] == entry[2] and e[3] == entry[3] for e in top):
+            return
+        if len(top) < TOP_K or entry < top[-1]:
+            top.append(entry)
+            top.sort()
+            del top[TOP_K:]
+
+    def lookup(self, prefix, limit=TOP_K):
+        node = self.root
+        for ch in fold(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return [
+            {"value": label, "type": kind, "count": -neg_count}
+            for neg_count, _, label, kind in node.top[:limit]
+        ]
+
+
+def build_index(version=None) -> PrefixIndex:
+    index = PrefixIndex(version)
+    active = Listing.objects.filter(is_active=True).order_by()
+
+    # Min() prefers the capitalized spelling among variants of one city.
+    for row in active.exclude(city_key="").values("city_key").annotate(n=Count("id"), label=Min("city")):
+        index.add(row["label"].strip(), "city", row["n"])
+    for row in active.exclude(country="").values("country").annotate(n=Count("id")):
+        index.add(row["country"].strip(), "country", row["n"])
+    for row in top_queries("30d", QUERY_SOURCE_LIMIT):
+        index.add(row["query"], "query", row["cnt"])
+    return index
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def mark_stale() -> None:
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def get_index() -> PrefixIndex:
+    global _index
+    version = current_version()
+    index = _index
+    if index is not None and index.version == version and time.monotonic() - index.built_at < MAX_AGE:
+        return index
+    with _lock:
+        if _index is index:
+            _index = build_index(version)
+        return _index
+
+
+def suggest(prefix, limit=TOP_K):
+    if not fold(prefix):
+        return []
+    return get_index().lookup(prefix, limit)
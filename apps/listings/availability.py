@@ -0,0 +1,75 @@
+"""Night-level availability index (``ListingOccupiedNight``) and its upkeep."""
+
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import ListingBlockedDate, ListingOccupiedNight
+
+ACTIVE_BOOKING_STATUSES = ("pending", "approved")
+
+
+def _nights(date_from, date_to):
+    d = date_from
+    while d < date_to:
+        yield d
+        d += timedelta(days=1)
+
+
+def _booking_rows(booking):
+    if booking.status not in ACTIVE_BOOKING_STATUSES:
+        return []
+    return [
+        ListingOccupiedNight(listing_id=booking.listing_id, date=d, booking_id=booking.pk)
+        for d in _nights(booking.date_from, booking.date_to)
+    ]
+
+
+def sync_booking_nights(booking):
+    with transaction.atomic():
+        ListingOccupiedNight.objects.filter(booking_id=booking.pk).delete()
+        ListingOccupiedNight.objects.bulk_create(_booking_rows(booking))
+
+
+def release_booking_nights(booking_ids):
+    ListingOccupiedNight.objects.filter(booking_id__in=list(booking_ids)).delete()
+
+
+def sync_blocked_date(blocked: ListingBlockedDate):
+    with transaction.atomic():
+        ListingOccupiedNight.objects.filter(blocked_date_id=blocked.pk).delete()
+        ListingOccupiedNight.objects.create(
+            listing_id=blocked.listing_id, date=blocked.date, blocked_date_id=blocked.pk
+        )
+
+
+def rebuild_availability(listing_ids):
+    """Recreate the occupied nights of the given listings from bookings and blocked dates."""
+    from apps.bookings.models import Booking
+
+    listing_ids = list(listing_ids)
+    bookings = Booking.objects.filter(
+        listing_id__in=listing_ids, status__in=ACTIVE_BOOKING_STATUSES
+    ).only("id", "listing_id", "date_from", "date_to", "status")
+    blocked = ListingBlockedDate.objects.filter(listing_id__in=listing_ids)
+
+    rows = []
+    for booking in bookings.iterator():
+        rows.extend(_booking_rows(booking))
+    rows.extend(
+        ListingOccupiedNight(listing_id=b.listing_id, date=b.date, blocked_date_id=b.pk)
+        for b in blocked.iterator()
+    )
+
+    with transaction.atomic():
+        ListingOccupiedNight.objects.filter(listing_id__in=listing_ids).delete()
+        ListingOccupiedNight.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def exclude_unavailable(qs, date_from, date_to):
+    """Keep only listings with no occupied night in ``[date_from, date_to)``."""
+    taken = ListingOccupiedNight.objects.filter(
+        date__gte=date_from, date__lt=date_to
+    ).values("listing_id")
+    return qs.exclude(pk__in=taken)
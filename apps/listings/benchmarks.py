@@ -0,0 +1,120 @@
+"""Helpers shared by the ``bench_*`` management commands."""
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from .fx import get_rates, to_base
+from .geo import cell_for
+from .models import Listing, ListingNeighbor, normalize_city
+from .search_index import get_search_backend
+
+BENCH_OWNER_EMAIL = "bench-owner@example.invalid"
+
+# (city, country, latitude, longitude of the centre)
+CITIES = [
+    ("Berlin", "DE", 52.52, 13.405),
+    ("Mannheim", "DE", 49.489, 8.467),
+    ("Hamburg", "DE", 53.551, 9.994),
+    ("Paris", "FR", 48.857, 2.352),
+    ("Lyon", "FR", 45.764, 4.836),
+    ("Москва", "RU", 55.756, 37.617),
+    ("Казань", "RU", 55.796, 49.106),
+    ("Київ", "UA", 50.450, 30.523),
+    ("Львів", "UA", 49.840, 24.030),
+    ("New York", "US", 40.713, -74.006),
+]
+# Listings are scattered up to this many degrees around the centre.
+CITY_SPREAD = 0.15
+STREETS = ["Hauptstraße", "Landwehrstraße", "Rue de Rivoli", "Тверская", "Хрещатик", "Broadway"]
+WORDS = [
+    "cozy", "bright", "quiet", "modern", "spacious", "central", "balcony", "garden",
+    "уютная", "светлая", "тихая", "центр", "балкон", "квартира", "студия", "loft",
+]
+
+
+def _text(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+@contextmanager
+def synthetic_listings(count, batch_size=2000, seed=42):
+    """Insert ``count`` throwaway listings, yield their owner, then remove them.
+
+    Rows are committed (InnoDB only indexes FULLTEXT on commit) and deleted
+    with a raw DELETE afterwards, so no signals run either way. The columns
+    ``Listing.save`` derives (``city_key``, ``price_base``, ``geo_cell``) are
+    filled the same way, since ``bulk_create`` skips ``save``.
+    """
+    User = get_user_model()
+    owner, _ = User.objects.get_or_create(
+        email=BENCH_OWNER_EMAIL,
+        defaults={"username": "bench-owner", "role": User.Role.LANDLORD},
+    )
+    rng = random.Random(seed)
+    rates = get_rates()
+    quantum = Decimal("0.000001")
+    try:
+        created = 0
+        while created < count:
+            batch = []
+            for _ in range(min(batch_size, count - created)):
+                city, country, lat, lng = rng.choice(CITIES)
+                latitude = Decimal(lat + rng.uniform(-CITY_SPREAD, CITY_SPREAD)).quantize(quantum)
+                longitude = Decimal(lng + rng.uniform(-CITY_SPREAD, CITY_SPREAD)).quantize(quantum)
+                price = Decimal(rng.randint(20, 400))
+                currency = rng.choice(Listing.Currency.values)
+                batch.append(Listing(
+                    owner=owner,
+                    title=_text(rng, 4),
+                    description=_text(rng, 60),
+                    city=city,
+                    city_key=normalize_city(city),
+                    country=country,
+                    street=rng.choice(STREETS),
+                    postal_code=str(rng.randint(10000, 99999)),
+                    house_number=str(rng.randint(1, 200)),
+                    price=price,
+                    currency=currency,
+                    price_base=to_base(price, currency, rates),
+                    latitude=latitude,
+                    longitude=longitude,
+                    geo_cell=cell_for(latitude, longitude),
+                    rooms=rng.randint(1, 5),
+                    max_guests=rng.randint(1, 8),
+                    housing_type=rng.choice(Listing.HousingType.values),
+                ))
+            Listing.objects.bulk_create(batch)
+            created += len(batch)
+        get_search_backend().rebuild()
+        yield owner
+    finally:
+        ListingNeighbor.objects.filter(Q(listing__owner=owner) | Q(neighbor__owner=owner)).delete()
+        qs = Listing.all_objects.filter(owner=owner)
+        qs._raw_delete(qs.db)
+        owner.delete()
+        get_search_backend().rebuild()
+
+
+def measure(fn, repeat):
+    """Run ``fn`` ``repeat`` times and return timing stats in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def format_stats(label, stats):
+    return f"{label:<32} min={stats['min']:8.2f}ms  median={stats['median']:8.2f}ms  p95={stats['p95']:8.2f}ms"
@@ -0,0 +1,93 @@
+"""Facet counts for the current listing search.
+
+Housing types, rooms buckets and the price histogram come from one
+``aggregate()`` of conditional counts over the filtered set; amenity counts
+are one grouped query on the amenities table restricted to that set. Results
+are cached under the search generation, like search result pages.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .fx import from_base, get_rates
+from .models import Amenity, Listing
+from .search_cache import search_cache_key
+
+ROOM_BUCKETS = (
+    ("1", Q(rooms__lte=1)),
+    ("2", Q(rooms=2)),
+    ("3", Q(rooms=3)),
+    ("4+", Q(rooms__gte=4)),
+)
+# Histogram edges in the base currency; the last bucket is open-ended.
+PRICE_EDGES = (0, 25, 50, 75, 100, 150, 200, 300, 500)
+# Parameters that do not change the filtered set.
+NON_FILTER_PARAMS = {"page", "page_size", "sort", "cursor", "pagination", "display_currency"}
+
+
+def _price_buckets():
+    edges = [Decimal(e) for e in PRICE_EDGES]
+    for i, low in enumerate(edges):
+        high = edges[i + 1] if i + 1 < len(edges) else None
+        q = Q(price_base__gte=low) & (Q(price_base__lt=high) if high is not None else Q())
+        yield low, high, q
+
+
+def compute_facets(spec) -> dict:
+    qs = spec.build().order_by()
+
+    aggregates = {"total": Count("id")}
+    for value, _ in Listing.HousingType.choices:
+        aggregates[f"housing_type:{value}"] = Count("id", filter=Q(housing_type=value))
+    for label, q in ROOM_BUCKETS:
+        aggregates[f"rooms:{label}"] = Count("id", filter=q)
+    for i, (_, _, q) in enumerate(_price_buckets()):
+        aggregates[f"price:{i}"] = Count("id", filter=q)
+    counts = qs.aggregate(**aggregates)
+
+    amenity_counts = dict(
+        Listing.amenities.through.objects
+        .filter(listing_id__in=qs.values("pk"))
+        .values("amenity_id")
+        .annotate(n=Count("listing_id"))
+        .values_list("amenity_id", "n")
+    )
+
+    rates = get_rates()
+    currency = spec.display_currency if spec.display_currency in rates else settings.LISTING_BASE_CURRENCY
+
+    def display(amount):
+        value = from_base(amount, currency, rates) if amount is not None else None
+        return str(value.quantize(Decimal("1"))) if value is not None else None
+
+    return {
+        "total": counts["total"],
+        "housing_type": [
+            {"value": value, "label": label, "count": counts[f"housing_type:{value}"]}
+            for value, label in Listing.HousingType.choices
+        ],
+        "rooms": [{"value": label, "count": counts[f"rooms:{label}"]} for label, _ in ROOM_BUCKETS],
+        "price": {
+            "currency": currency,
+            "buckets": [
+                {"from": display(low), "to": display(high), "count": counts[f"price:{i}"]}
+                for i, (low, high, _) in enumerate(_price_buckets())
+            ],
+        },
+        "amenities": [
+            {"id": a["id"], "name": a["name"], "count": amenity_counts.get(a["id"], 0)}
+            for a in Amenity.objects.values("id", "name")
+        ],
+    }
+
+
+def cached_facets(spec, params) -> dict:
+    key = search_cache_key("facets", params, ignore=NON_FILTER_PARAMS) + ":" + spec.display_currency
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(spec)
+        cache.set(key, facets, settings.LISTING_SEARCH_CACHE_TTL)
+    return facets
@@ -0,0 +1,96 @@
+"""Offline exchange rates and the ``Listing.price_base`` column built from them.
+
+Rates live in ``ExchangeRate`` (loaded with ``load_fx_rates``) as units of a
+currency per one unit of ``settings.LISTING_BASE_CURRENCY``. Every listing
+keeps its nightly price converted to the base currency, so price filters and
+sorts across currencies are a single range scan on one indexed column.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Round
+
+from .models import ExchangeRate, Listing
+
+RATES_CACHE_KEY = "fx:rates"
+CENT = Decimal("0.01")
+
+
+def get_rates() -> dict:
+    rates = cache.get(RATES_CACHE_KEY)
+    if rates is None:
+        rates = dict(ExchangeRate.objects.values_list("currency", "units_per_base"))
+        rates.setdefault(settings.LISTING_BASE_CURRENCY, Decimal("1"))
+        cache.set(RATES_CACHE_KEY, rates, timeout=None)
+    return rates
+
+
+def clear_rates_cache() -> None:
+    cache.delete(RATES_CACHE_KEY)
+
+
+def to_base(amount, currency, rates=None):
+    """Convert ``amount`` in ``currency`` to the base currency; ``None`` without a rate."""
+    rate = (rates if rates is not None else get_rates()).get(currency)
+    if amount is None or not rate:
+        return None
+    return (Decimal(amount) / rate).quantize(CENT, ROUND_HALF_UP)
+
+
+def from_base(amount, currency, rates=None):
+    rate = (rates if rates is not None else get_rates()).get(currency)
+    if amount is None or not rate:
+        return None
+    return (Decimal(amount) * rate).quantize(CENT, ROUND_HALF_UP)
+
+
+def recompute_price_base(currencies=None) -> int:
+    """Rewrite ``price_base`` with one UPDATE per currency; returns rows touched."""
+    rates = get_rates()
+    currencies = set(currencies) if currencies else set(Listing.Currency.values)
+    updated = 0
+    with transaction.atomic():
+        for currency in sorted(currencies):
+            qs = Listing.all_objects.filter(currency=currency)
+            rate = rates.get(currency)
+            if rate:
+                updated += qs.update(price_base=Round(F("price") / Value(rate), 2))
+            else:
+                updated += qs.update(price_base=None)
+    return updated
+
+
+def load_rates(base, rates) -> list:
+    """Store ``{currency: units_per_base}`` and return the currencies that changed.
+
+    Saving a rate recomputes the prices in that currency (see ``signals.py``).
+    """
+    if base != settings.LISTING_BASE_CURRENCY:
+        raise ValueError(f"rates are quoted against {base}, expected {settings.LISTING_BASE_CURRENCY}")
+
+    parsed = {}
+    for currency, value in rates.items():
+        if currency not in Listing.Currency.values:
+            raise ValueError(f"unknown currency {currency}")
+        try:
+            parsed[currency] = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError(f"bad rate for {currency}: {value!r}")
+        if parsed[currency] <= 0:
+            raise ValueError(f"bad rate for {currency}: {value!r}")
+
+    changed = []
+    with transaction.atomic():
+        existing = {r.currency: r for r in ExchangeRate.objects.select_for_update()}
+        for currency, value in sorted(parsed.items()):
+            rate = existing.get(currency) or ExchangeRate(currency=currency)
+            if rate.pk and rate.units_per_base == value:
+                continue
+            rate.units_per_base = value
+            rate.save()
+            changed.append(currency)
+    return changed
@@ -0,0 +1,144 @@
+"""Grid-cell index for map search over listing coordinates.
+
+Every listing with coordinates stores ``geo_cell``: the id of the
+``CELL_DEG`` x ``CELL_DEG`` cell it falls into, numbered row by row from the
+south-west corner. A bounding box then becomes one ``geo_cell BETWEEN`` range
+per covered latitude row, an index range scan, and exact distances are
+computed with a vectorized haversine over those candidates only.
+"""
+
+import math
+from typing import NamedTuple
+
+import numpy as np
+from django.db.models import Q
+
+CELL_DEG = 0.1
+LAT_CELLS = round(180 / CELL_DEG)
+LNG_CELLS = round(360 / CELL_DEG)
+# Wider boxes (zoomed far out) filter by coordinate range instead of listing hundreds of cell ranges.
+MAX_CELL_ROWS = 60
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+class BBox(NamedTuple):
+    south: float
+    west: float
+    north: float
+    east: float
+
+    @property
+    def center(self):
+        lng = (self.west + self.east) / 2
+        if self.west > self.east:
+            lng = (lng + 360) % 360 - 180
+        return (self.south + self.north) / 2, lng
+
+
+def _lat_row(lat) -> int:
+    return min(max(int(math.floor((float(lat) + 90) / CELL_DEG)), 0), LAT_CELLS - 1)
+
+
+def _lng_col(lng) -> int:
+    return int(math.floor((float(lng) + 180) / CELL_DEG)) % LNG_CELLS
+
+
+def cell_for(lat, lng):
+    """Grid cell id for a coordinate pair, ``None`` when either is missing."""
+    if lat is None or lng is None:
+        return None
+    return _lat_row(lat) * LNG_CELLS + _lng_col(lng)
+
+
+def parse_bbox(value) -> BBox:
+    """Parse ``south,west,north,east``; raises ``ValueError`` on bad input."""
+    parts = [float(p) for p in str(value).split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must have four numbers")
+    bbox = BBox(*parts)
+    if not (-90 <= bbox.south <= bbox.north <= 90):
+        raise ValueError("latitude out of range")
+    if not (-180 <= bbox.west <= 180 and -180 <= bbox.east <= 180):
+        raise ValueError("longitude out of range")
+    return bbox
+
+
+def bbox_around(lat, lng, radius_km) -> BBox:
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    if abs(lat) + dlat >= 90 or cos_lat < 1e-6:
+        return BBox(max(lat - dlat, -90), -180, min(lat + dlat, 90), 180)
+    dlng = radius_km / (KM_PER_DEGREE * cos_lat)
+    if dlng >= 180:
+        west, east = -180, 180
+    else:
+        west = (lng - dlng + 180) % 360 - 180
+        east = (lng + dlng + 180) % 360 - 180
+    return BBox(max(lat - dlat, -90), west, min(lat + dlat, 90), east)
+
+
+def bbox_filter(bbox: BBox) -> Q:
+    """Coarse filter selecting listings in the cells covered by ``bbox``."""
+    if bbox.west <= bbox.east:
+        spans = [(_lng_col(bbox.west), _lng_col(bbox.east))]
+        lng_q = Q(longitude__gte=bbox.west, longitude__lte=bbox.east)
+    else:
+        spans = [(_lng_col(bbox.west), LNG_CELLS - 1), (0, _lng_col(bbox.east))]
+        lng_q = Q(longitude__gte=bbox.west) | Q(longitude__lte=bbox.east)
+    if spans[0][0] > spans[0][1]:
+        # A box reaching exactly 180°E wraps its last column to 0.
+        spans = [(spans[0][0], LNG_CELLS - 1), (0, spans[0][1])]
+
+    rows = range(_lat_row(bbox.south), _lat_row(bbox.north) + 1)
+    if len(rows) > MAX_CELL_ROWS:
+        return Q(latitude__gte=bbox.south, latitude__lte=bbox.north) & lng_q
+
+    q = Q()
+    for row in rows:
+        base = row * LNG_CELLS
+        for lo, hi in spans:
+            q |= Q(geo_cell__gte=base + lo, geo_cell__lte=base + hi)
+    return q
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances from one point to arrays of points, in km."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def map_search(qs, bbox: BBox, center=None, radius_km=None, limit=200):
+    """Return ``[(listing_id, distance_km), ...]`` inside ``bbox``, nearest first.
+
+    Distances are measured from ``center`` (the middle of ``bbox`` by
+    default); with ``radius_km`` only listings within that distance are kept.
+    """
+    rows = list(
+        qs.order_by()
+        .filter(bbox_filter(bbox))
+        .values_list("pk", "latitude", "longitude")
+    )
+    if not rows:
+        return []
+
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    lats = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+    lngs = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+
+    mask = (lats >= bbox.south) & (lats <= bbox.north)
+    if bbox.west <= bbox.east:
+        mask &= (lngs >= bbox.west) & (lngs <= bbox.east)
+    else:
+        mask &= (lngs >= bbox.west) | (lngs <= bbox.east)
+
+    lat0, lng0 = center if center is not None else bbox.center
+    distances = haversine_km(lat0, lng0, lats, lngs)
+    if radius_km is not None:
+        mask &= distances <= radius_km
+
+    hits = np.flatnonzero(mask)
+    nearest = hits[np.argsort(distances[hits], kind="stable")][:limit]
+    return [(int(ids[i]), float(distances[i])) for i in nearest]
@@ -0,0 +1,96 @@
+"""Listing sections of the home page, precomputed by a beat task.
+
+``refresh_home_sections`` stores the ids of each section (and the amenity
+tags) in the cache together with the time they were computed. The home page
+only reads that entry and loads the listings by primary key. An entry older
+than ``HOME_SECTIONS_TTL`` is still served while one refresh is queued in
+the background; with no entry at all the page shows the newest listings,
+which is a single index scan, until the first refresh lands.
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+from .models import Amenity, Listing
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "home:sections"
+REFRESH_LOCK_KEY = "home:sections:refreshing"
+HOME_SECTIONS_TTL = 120
+# How long a stale entry may still be served if refreshes stop.
+STALE_TTL = 24 * 3600
+SECTION_SIZE = 8
+AMENITIES_SHOWN = 12
+
+SECTIONS = {
+    "popular": ("-reviews_count", "-avg_rating", "-id"),
+    "new": ("-created_at", "-id"),
+    "trending": ("-view_stat__trending_score", "-created_at"),
+}
+
+
+def _now() -> float:
+    return time.time()
+
+
+def compute_sections() -> dict:
+    active = Listing.objects.filter(is_active=True)
+    sections = {
+        "popular": list(active.order_by(*SECTIONS["popular"]).values_list("id", flat=True)[:SECTION_SIZE]),
+        "new": list(active.order_by(*SECTIONS["new"]).values_list("id", flat=True)[:SECTION_SIZE]),
+        "trending": list(
+            active.filter(view_stat__trending_score__isnull=False)
+            .order_by(*SECTIONS["trending"])
+            .values_list("id", flat=True)[:SECTION_SIZE]
+        ),
+    }
+    amenities = list(Amenity.objects.values("name", "icon")[:AMENITIES_SHOWN])
+    return {"built_at": _now(), "sections": sections, "amenities": amenities}
+
+
+def refresh_home_sections() -> dict:
+    entry = compute_sections()
+    cache.set(CACHE_KEY, entry, STALE_TTL)
+    cache.delete(REFRESH_LOCK_KEY)
+    return entry
+
+
+def _schedule_refresh() -> None:
+    from .tasks import refresh_home_page_sections
+
+    if not cache.add(REFRESH_LOCK_KEY, 1, HOME_SECTIONS_TTL):
+        return
+    try:
+        refresh_home_page_sections.delay()
+    except Exception:
+        cache.delete(REFRESH_LOCK_KEY)
+        logger.warning("home sections: failed to queue a refresh", exc_info=True)
+
+
+def _cold_entry() -> dict:
+    newest = Listing.objects.filter(is_active=True).order_by(*SECTIONS["new"])
+    return {
+        "sections": {"new": list(newest.values_list("id", flat=True)[:SECTION_SIZE])},
+        "amenities": [],
+    }
+
+
+def get_home_sections(queryset) -> dict:
+    """``{"popular": [...], "new": [...], "trending": [...], "amenities": [...]}`` for the home page.
+
+    Listings are loaded from ``queryset`` (with its select/prefetch) by id;
+    listings deactivated since the last refresh are left out.
+    """
+    entry = cache.get(CACHE_KEY)
+    if entry is None or _now() - entry["built_at"] > HOME_SECTIONS_TTL:
+        _schedule_refresh()
+        entry = cache.get(CACHE_KEY) or _cold_entry()
+
+    sections = entry["sections"]
+    objects = queryset.in_bulk({pk for ids in sections.values() for pk in ids})
+    result = {name: [objects[pk] for pk in sections.get(name, []) if pk in objects] for name in SECTIONS}
+    result["amenities"] = entry["amenities"]
+    return result
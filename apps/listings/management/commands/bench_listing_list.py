@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from apps.listings.benchmarks import measure, synthetic_listings
+from apps.listings.models import Listing
+from apps.listings.serializers import ListingListSerializer, ListingSerializer
+from apps.listings.search import views_total_annotation
+
+DEFAULT_PAGE_SIZES = [10, 50, 100]
+
+
+class Command(BaseCommand):
+    help = "Сравнивает ListingSerializer и ListingListSerializer на страницах списка объявлений"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--page-size", type=int, action="append", dest="page_sizes")
+        parser.add_argument("--fields", default="", help="?fields= для варианта со строками")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        fields = ListingListSerializer.parse_fields(options["fields"])
+
+        self.stdout.write(f"Создаём {options['listings']} объявлений")
+        with synthetic_listings(options["listings"]) as owner:
+            qs = (
+                Listing.objects.filter(owner=owner, is_active=True)
+                .annotate(_views_total=views_total_annotation())
+                .order_by("-created_at", "-id")
+            )
+            for page_size in options["page_sizes"] or DEFAULT_PAGE_SIZES:
+                self.stdout.write(f"\npage_size={page_size}")
+                variants = (
+                    ("ListingSerializer", lambda: ListingSerializer(qs[:page_size], many=True).data),
+                    ("ListingListSerializer", lambda: ListingListSerializer(
+                        ListingListSerializer.select(qs, fields)[:page_size], many=True, fields=fields,
+                    ).data),
+                )
+                for label, run in variants:
+                    stats = measure(run, repeat)
+                    self.stdout.write(
+                        f"{label:<24} median={stats['median']:8.2f}ms  p95={stats['p95']:8.2f}ms  "
+                        f"{page_size * 1000 / stats['median']:10.0f} rows/s"
+                    )
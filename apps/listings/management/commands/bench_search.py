@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.listings.benchmarks import format_stats, measure, synthetic_listings
+from apps.listings.search_index import IcontainsSearchBackend, get_search_backend
+from apps.listings.services import base_listing_queryset
+
+DEFAULT_QUERIES = ["Berlin", "балкон", "modern loft", "Тверская", "75001"]
+
+
+class Command(BaseCommand):
+    help = "Сравнивает полнотекстовый поиск с icontains на синтетических объявлениях"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--query", action="append", dest="queries")
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or DEFAULT_QUERIES
+        repeat = max(1, options["repeat"])
+        fulltext = get_search_backend()
+        icontains = IcontainsSearchBackend()
+
+        self.stdout.write(f"Создаём {options['listings']} объявлений, бэкенд: {fulltext.name}")
+        with synthetic_listings(options["listings"]):
+            for query in queries:
+                self.stdout.write(f"\nq={query!r}")
+                for backend in (icontains, fulltext):
+                    def run(backend=backend):
+                        qs = backend.filter(base_listing_queryset(), query)
+                        list(qs.order_by("-created_at").values_list("id", flat=True)[:12])
+                        qs.count()
+
+                    self.stdout.write(format_stats(backend.name, measure(run, repeat)))
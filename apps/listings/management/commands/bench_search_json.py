@@ -0,0 +1,88 @@
+import json
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from apps.common.fastjson import dumps
+from apps.listings.benchmarks import format_stats, measure, synthetic_listings
+from apps.listings.fx import from_base, get_rates
+from apps.listings.models import Listing
+from apps.listings.search_rows import build_search_rows, search_row_values
+
+
+def _legacy_page(ids, display_currency, rates):
+    """The previous ``listings_search`` path: model instances and ``json.dumps``."""
+    objects = Listing.objects.in_bulk(ids)
+    rows = []
+    for pk in ids:
+        x = objects[pk]
+        display_price = from_base(x.price_base, display_currency, rates)
+        rows.append({
+            "id": x.id,
+            "title": x.title,
+            "description": x.description,
+            "price": str(x.price),
+            "currency": x.currency,
+            "display_price": str(display_price) if display_price is not None else None,
+            "rooms": x.rooms,
+            "housing_type": x.housing_type,
+            "parking_type": x.parking_type,
+            "country": x.country,
+            "city": x.city,
+            "postal_code": x.postal_code,
+            "street": x.street,
+            "house_number": x.house_number,
+            "floor": x.floor,
+            "apartment_number": x.apartment_number,
+            "full_address": x.full_address(),
+            "created_at": x.created_at.isoformat() if x.created_at else None,
+            "avg_rating": float(x.avg_rating),
+            "reviews_count": x.reviews_count,
+        })
+    return json.dumps({"results": rows}, ensure_ascii=False).encode()
+
+
+def _values_page(ids, display_currency, rates):
+    rows = {row["id"]: row for row in search_row_values(Listing.objects.filter(pk__in=ids))}
+    return dumps({"results": build_search_rows([rows[pk] for pk in ids], display_currency, rates)})
+
+
+def _peak_allocated(fn):
+    """Peak bytes allocated while ``fn`` runs, as seen by ``tracemalloc``."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+class Command(BaseCommand):
+    help = "Сравнивает сериализацию страницы listings_search через объекты модели и через values()"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=10_000)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--display-currency", default="USD")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        currency = options["display_currency"].upper()
+
+        self.stdout.write(f"Создаём {options['listings']} объявлений, страница {options['page_size']} строк")
+        with synthetic_listings(options["listings"]) as owner:
+            ids = list(
+                Listing.objects.filter(owner=owner)
+                .order_by("-created_at")
+                .values_list("pk", flat=True)[:options["page_size"]]
+            )
+            rates = get_rates()
+            for label, build in (("model objects + json", _legacy_page), ("values() + fast json", _values_page)):
+                def run(build=build):
+                    return build(ids, currency, rates)
+
+                run()
+                peak = _peak_allocated(run)
+                self.stdout.write(f"{format_stats(label, measure(run, repeat))}  peak={peak / 1024:.1f}KiB")
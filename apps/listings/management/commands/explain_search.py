@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.listings.search import FILTERS, SORT_ORDERINGS, explain_shape, shape_sql
+
+
+class Command(BaseCommand):
+    help = "Печатает SQL и план выполнения поиска объявлений для каждого фильтра и сортировки"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filters", default="", help="Фильтры через запятую, например city,dates")
+        parser.add_argument("--sort", default="", help="Одна сортировка вместо всех")
+        parser.add_argument("--sql", action="store_true", help="Показывать SQL запроса")
+
+    def handle(self, *args, **options):
+        filters = tuple(f for f in FILTERS if f in options["filters"].split(","))
+        sorts = [options["sort"]] if options["sort"] else list(SORT_ORDERINGS)
+        if "q" not in filters:
+            sorts = [s for s in sorts if s != "relevance"]
+
+        shapes = [(filters, s) for s in sorts] if filters else [((f,), s) for f in FILTERS for s in sorts]
+        for shape in shapes:
+            if shape[1] == "relevance" and "q" not in shape[0]:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{','.join(shape[0]) or '-'} / {shape[1]}"))
+            if options["sql"]:
+                self.stdout.write(shape_sql(shape))
+            self.stdout.write(explain_shape(shape))
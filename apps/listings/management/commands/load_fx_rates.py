@@ -0,0 +1,24 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.listings.fx import load_rates
+
+
+class Command(BaseCommand):
+    help = "Загружает курсы валют из JSON-файла и пересчитывает цены объявлений в базовой валюте"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default=settings.FX_RATES_FILE)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], encoding="utf-8") as f:
+                data = json.load(f)
+            changed = load_rates(data["base"], data["rates"])
+        except (OSError, KeyError, TypeError, ValueError) as exc:
+            raise CommandError(f"Не удалось загрузить курсы: {exc}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово. Обновлено курсов: {len(changed)}" + (f" ({', '.join(changed)})" if changed else "")
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.listings.availability import rebuild_availability
+from apps.listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Пересобирает индекс занятых ночей из броней и заблокированных дат пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        last_id = 0
+        nights = 0
+        while True:
+            ids = list(
+                Listing.all_objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            nights += rebuild_availability(ids)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Готово. Занятых ночей: {nights}"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.listings.models import Listing
+from apps.listings.services import recompute_listing_ratings
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сохранённые рейтинг и количество отзывов объявлений пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Listing.all_objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            updated += recompute_listing_ratings(ids)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Готово. Обновлено объявлений: {updated}"))
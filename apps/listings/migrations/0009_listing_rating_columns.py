@@ -0,0 +1,58 @@
+# Generated by Django 5.0 on 2026-10-18 07:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_columns(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    Review = apps.get_model("reviews", "Review")
+
+    rows = (
+        Review.objects.order_by()
+        .values("listing_id")
+        .annotate(total=Sum("rating"), cnt=Count("id"))
+    )
+    for row in rows.iterator():
+        Listing.objects.filter(pk=row["listing_id"]).update(
+            rating_sum=row["total"],
+            reviews_count=row["cnt"],
+            avg_rating=row["total"] / row["cnt"],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_instant_book_listing_latitude_and_more'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='avg_rating',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отзывов'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['reviews_count', 'avg_rating'], name='listings_li_reviews_e60c19_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['avg_rating', 'reviews_count'], name='listings_li_avg_rat_4e272f_idx'),
+        ),
+        migrations.RunPython(backfill_rating_columns, migrations.RunPython.noop),
+    ]
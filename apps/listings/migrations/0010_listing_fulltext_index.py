@@ -0,0 +1,48 @@
+from django.db import migrations
+
+SEARCH_COLUMNS = ("title", "description", "city", "country", "street", "postal_code")
+FTS_TABLE = "listings_listing_fts"
+FULLTEXT_INDEX = "listings_listing_fulltext"
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    columns = ", ".join(SEARCH_COLUMNS)
+
+    if connection.vendor == "mysql":
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON listings_listing ({columns})"
+        )
+    elif connection.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite built without FTS5: the search layer falls back to icontains.
+            return
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) "
+            f"SELECT id, {columns} FROM listings_listing"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == "mysql":
+        schema_editor.execute(f"DROP INDEX {FULLTEXT_INDEX} ON listings_listing")
+    elif connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_rating_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
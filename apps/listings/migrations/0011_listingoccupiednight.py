@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 07:05
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_occupied_nights(apps, schema_editor):
+    Booking = apps.get_model("bookings", "Booking")
+    ListingBlockedDate = apps.get_model("listings", "ListingBlockedDate")
+    ListingOccupiedNight = apps.get_model("listings", "ListingOccupiedNight")
+
+    rows = []
+    bookings = Booking.objects.filter(status__in=["pending", "approved"])
+    for booking in bookings.iterator():
+        d = booking.date_from
+        while d < booking.date_to:
+            rows.append(ListingOccupiedNight(listing_id=booking.listing_id, date=d, booking_id=booking.pk))
+            d += timedelta(days=1)
+    for blocked in ListingBlockedDate.objects.iterator():
+        rows.append(ListingOccupiedNight(listing_id=blocked.listing_id, date=blocked.date, blocked_date_id=blocked.pk))
+    ListingOccupiedNight.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_payment_transaction_id_length'),
+        ('listings', '0010_listing_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingOccupiedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('blocked_date', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='listings.listingblockeddate')),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='bookings.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'listing'], name='listings_li_date_a02b3a_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_occupied_nights, migrations.RunPython.noop),
+    ]
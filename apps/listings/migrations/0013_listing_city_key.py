@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-18 07:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_city_key(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    rows = []
+    for listing in Listing.objects.only("id", "city").iterator():
+        listing.city_key = " ".join(listing.city.split()).casefold()
+        rows.append(listing)
+    Listing.objects.bulk_update(rows, ["city_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='city_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_city_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['city_key', 'created_at'], name='listings_li_city_ke_53cbdc_idx'),
+        ),
+    ]
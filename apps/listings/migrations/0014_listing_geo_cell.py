@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 07:15
+
+from django.conf import settings
+import math
+
+from django.db import migrations, models
+
+
+def backfill_geo_cell(apps, schema_editor):
+    # Same 0.1° grid as apps.listings.geo.cell_for.
+    Listing = apps.get_model("listings", "Listing")
+    rows = []
+    qs = Listing.objects.exclude(latitude=None).exclude(longitude=None).only("id", "latitude", "longitude")
+    for listing in qs.iterator():
+        lat_row = min(max(int(math.floor((float(listing.latitude) + 90) / 0.1)), 0), 1799)
+        lng_col = int(math.floor((float(listing.longitude) + 180) / 0.1)) % 3600
+        listing.geo_cell = lat_row * 3600 + lng_col
+        rows.append(listing)
+    Listing.objects.bulk_update(rows, ["geo_cell"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_listing_city_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geo_cell',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_geo_cell, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['geo_cell'], name='listings_li_geo_cel_b94d9c_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0 on 2026-10-18 07:18
+
+import json
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Round
+
+
+def seed_rates(apps, schema_editor):
+    """Load the bundled rates so price_base is filled right away; load_fx_rates refreshes them."""
+    ExchangeRate = apps.get_model("listings", "ExchangeRate")
+    Listing = apps.get_model("listings", "Listing")
+
+    data = json.loads((Path(__file__).resolve().parent.parent / "data" / "fx_rates.json").read_text())
+    if data["base"] != settings.LISTING_BASE_CURRENCY:
+        return
+    for currency, value in data["rates"].items():
+        rate = Decimal(value)
+        ExchangeRate.objects.update_or_create(currency=currency, defaults={"units_per_base": rate})
+        Listing.objects.filter(currency=currency).update(price_base=Round(F("price") / Value(rate), 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_listing_geo_cell'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('EUR', 'EUR'), ('RUB', 'RUB'), ('UAH', 'UAH')], max_length=3, unique=True, verbose_name='Валюта')),
+                ('units_per_base', models.DecimalField(decimal_places=6, max_digits=18, verbose_name='Курс к базовой валюте')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Курс валюты',
+                'verbose_name_plural': 'Курсы валют',
+                'ordering': ['currency'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='price_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True, verbose_name='Цена в базовой валюте'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['price_base'], name='listings_li_price_b_8e4516_idx'),
+        ),
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+    ]
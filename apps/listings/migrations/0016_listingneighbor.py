@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 07:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_exchangerate_listing_price_base'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('distance', models.FloatField(verbose_name='Расстояние')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='listings.listing', verbose_name='Объявление')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_of', to='listings.listing', verbose_name='Похожее объявление')),
+            ],
+            options={
+                'verbose_name': 'Похожее объявление',
+                'verbose_name_plural': 'Похожие объявления',
+                'ordering': ['listing', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='listingneighbor',
+            constraint=models.UniqueConstraint(fields=('listing', 'rank'), name='unique_listing_neighbor_rank'),
+        ),
+    ]
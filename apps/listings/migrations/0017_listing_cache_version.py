@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0016_listingneighbor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
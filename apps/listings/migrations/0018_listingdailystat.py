@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 08:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0017_listing_cache_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='Уникальные посетители')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='listings.listing', verbose_name='Объявление')),
+            ],
+            options={
+                'verbose_name': 'Статистика объявления за день',
+                'verbose_name_plural': 'Статистика объявлений по дням',
+                'ordering': ['listing', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='listingdailystat',
+            constraint=models.UniqueConstraint(fields=('listing', 'date'), name='unique_listing_daily_stat'),
+        ),
+    ]
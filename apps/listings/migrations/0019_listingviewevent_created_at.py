@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 08:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0018_listingdailystat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingviewevent',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
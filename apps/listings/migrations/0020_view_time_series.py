@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-18 08:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0019_listingviewevent_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingviewstat',
+            name='trending_score',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ListingHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='listings.listing', verbose_name='Объявление')),
+            ],
+            options={
+                'verbose_name': 'Статистика объявления за час',
+                'verbose_name_plural': 'Статистика объявлений по часам',
+                'ordering': ['listing', 'hour'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='listinghourlystat',
+            constraint=models.UniqueConstraint(fields=('listing', 'hour'), name='unique_listing_hourly_stat'),
+        ),
+    ]
@@ -1,8 +1,30 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal
 from apps.common.models import SoftDeleteModel
 
+from .geo import cell_for
+
+
+def normalize_city(value) -> str:
+    """Case- and whitespace-insensitive form of a city name used for exact matching."""
+    return " ".join(str(value or "").split()).casefold()
+
+
+def format_address(country, city, postal_code, street, house_number, floor, apartment_number) -> str:
+    base = ", ".join([p for p in (country, city, postal_code, street, house_number) if p])
+
+    extra = []
+    if floor:
+        extra.append(f"этаж {floor}")
+    if apartment_number:
+        extra.append(f"кв. {apartment_number}")
+
+    if extra and base:
+        return f"{base}, " + ", ".join(extra)
+    return base or ", ".join(extra) or ""
+
 
 class Listing(SoftDeleteModel):
     class HousingType(models.TextChoices):
@@ -31,6 +53,7 @@ class Listing(SoftDeleteModel):
 
     country = models.CharField(max_length=100, blank=True, default="", verbose_name="Страна")
     city = models.CharField(max_length=100, blank=True, default="", verbose_name="Город")
+    city_key = models.CharField(max_length=100, blank=True, default="", editable=False)
     postal_code = models.CharField(max_length=20, blank=True, default="", verbose_name="Индекс")
     street = models.CharField(max_length=255, blank=True, default="", verbose_name="Улица")
     house_number = models.CharField(max_length=20, blank=True, default="", verbose_name="Дом")
@@ -73,6 +96,14 @@ class Listing(SoftDeleteModel):
     is_active = models.BooleanField(default=True, verbose_name="Активно")
     instant_book = models.BooleanField(default=False, verbose_name="Мгновенное бронирование")
     min_nights = models.PositiveSmallIntegerField(default=1, verbose_name="Мин. ночей")
+    price_base = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Цена в базовой валюте",
+    )
     platform_fee_percent = models.DecimalField(
         max_digits=5,
         decimal_places=2,
@@ -85,6 +116,13 @@ class Listing(SoftDeleteModel):
     longitude = models.DecimalField(
         max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Долгота"
     )
+    geo_cell = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    reviews_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Отзывов")
+    avg_rating = models.FloatField(default=0.0, editable=False, verbose_name="Рейтинг")
+    # Bumped whenever anything shown on the listing card changes (see web/cards.py).
+    cache_version = models.PositiveIntegerField(default=1, editable=False)
 
     amenities = models.ManyToManyField(
         "Amenity",
@@ -100,32 +138,59 @@ class Listing(SoftDeleteModel):
         verbose_name = "Объявление"
         verbose_name_plural = "Объявления"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["reviews_count", "avg_rating"]),
+            models.Index(fields=["avg_rating", "reviews_count"]),
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["city_key", "created_at"]),
+            models.Index(fields=["geo_cell"]),
+            models.Index(fields=["price"]),
+            models.Index(fields=["price_base"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} — {self.price}"
 
-
+    def save(self, *args, **kwargs):
+        from .fx import to_base
+
+        self.city_key = normalize_city(self.city)
+        self.geo_cell = cell_for(self.latitude, self.longitude)
+        self.price_base = to_base(self.price, self.currency)
+        # Bumped in the database: reviews and images bump it with F() too, and an
+        # in-memory +1 could reuse a version another writer already cached under.
+        bump = self.pk is not None and not self._state.adding
+        if bump:
+            self.cache_version = models.F("cache_version") + 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields) | {"cache_version"}
+            if "city" in update_fields:
+                update_fields.add("city_key")
+            if update_fields & {"price", "currency"}:
+                update_fields.add("price_base")
+            if update_fields & {"latitude", "longitude"}:
+                update_fields.add("geo_cell")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=["cache_version"])
 
     def full_address(self) -> str:
-
-        parts = [
+        return format_address(
             self.country,
             self.city,
             self.postal_code,
             self.street,
             self.house_number,
-        ]
-        base = ", ".join([p for p in parts if p])
-
-        extra = []
-        if self.floor:
-            extra.append(f"этаж {self.floor}")
-        if self.apartment_number:
-            extra.append(f"кв. {self.apartment_number}")
+            self.floor,
+            self.apartment_number,
+        )
 
-        if extra and base:
-            return f"{base}, " + ", ".join(extra)
-        return base or ", ".join(extra) or ""
+    def reset_review_stats(self):
+        self.rating_sum = 0
+        self.reviews_count = 0
+        self.avg_rating = 0.0
 
     def price_for_stay(self, date_from, date_to):
         nights = (date_to - date_from).days
@@ -142,10 +207,11 @@ class Listing(SoftDeleteModel):
 
     @property
     def primary_image(self):
-        img = self.images.filter(is_primary=True).first()
-        if img:
-            return img
-        return self.images.order_by("order", "id").first()
+        """The image marked primary, else the first one; served from ``prefetch_related("images")`` when present."""
+        if "images" in getattr(self, "_prefetched_objects_cache", {}):
+            images = self.images.all()
+            return next((img for img in images if img.is_primary), images[0] if images else None)
+        return self.images.order_by("-is_primary", "order", "id").first()
 
 
 class ListingBlockedDate(models.Model):
@@ -170,6 +236,43 @@ class ListingBlockedDate(models.Model):
         return f"{self.listing_id} — {self.date}"
 
 
+class ListingOccupiedNight(models.Model):
+    """One row per night a listing is taken, by an active booking or a blocked date.
+
+    Maintained from booking/blocked-date signals (see ``availability.py``) so
+    date-range search is an indexed range lookup instead of an anti-join.
+    """
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="occupied_nights",
+    )
+    date = models.DateField()
+    booking = models.ForeignKey(
+        "bookings.Booking",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="occupied_nights",
+    )
+    blocked_date = models.ForeignKey(
+        ListingBlockedDate,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="occupied_nights",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "listing"]),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} — {self.date}"
+
+
 class Amenity(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Название")
     icon = models.CharField(max_length=8, blank=True, default="", verbose_name="Иконка")
@@ -237,6 +340,9 @@ class ListingViewStat(models.Model):
         primary_key=True,
     )
     views_total = models.PositiveIntegerField(default=0)
+    # log2 of recent views decayed by age, kept up to date by the view flush
+    # (see view_stats.decayed_score); only comparable between listings.
+    trending_score = models.FloatField(null=True, blank=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -253,7 +359,8 @@ class ListingViewEvent(models.Model):
         on_delete=models.CASCADE,
         related_name="listing_views",
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the view happens: rows are written later, in batches.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
@@ -265,6 +372,60 @@ class ListingViewEvent(models.Model):
     def __str__(self):
         return f"user={self.user_id} listing={self.listing_id}"
 
+
+class ListingDailyStat(models.Model):
+    """Views and unique visitors of one listing on one day.
+
+    Views are added by every view flush; unique visitors are folded from
+    Redis by a nightly job.
+    """
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        verbose_name="Объявление",
+    )
+    date = models.DateField(verbose_name="Дата")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    unique_visitors = models.PositiveIntegerField(default=0, verbose_name="Уникальные посетители")
+
+    class Meta:
+        verbose_name = "Статистика объявления за день"
+        verbose_name_plural = "Статистика объявлений по дням"
+        ordering = ["listing", "date"]
+        constraints = [
+            models.UniqueConstraint(fields=["listing", "date"], name="unique_listing_daily_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} {self.date}: {self.unique_visitors}/{self.views}"
+
+
+class ListingHourlyStat(models.Model):
+    """Views of one listing in one hour, added by every view flush."""
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="hourly_stats",
+        verbose_name="Объявление",
+    )
+    hour = models.DateTimeField(verbose_name="Час")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+
+    class Meta:
+        verbose_name = "Статистика объявления за час"
+        verbose_name_plural = "Статистика объявлений по часам"
+        ordering = ["listing", "hour"]
+        constraints = [
+            models.UniqueConstraint(fields=["listing", "hour"], name="unique_listing_hourly_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} {self.hour:%Y-%m-%d %H}:00: {self.views}"
+
+
 class SearchQuery(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -285,4 +446,59 @@ class SearchQuery(models.Model):
         ]
 
     def __str__(self):
-        return self.query
\ No newline at end of file
+        return self.query
+
+
+class ExchangeRate(models.Model):
+    """How many units of ``currency`` one unit of the base currency buys."""
+
+    currency = models.CharField(
+        max_length=3,
+        choices=Listing.Currency.choices,
+        unique=True,
+        verbose_name="Валюта",
+    )
+    units_per_base = models.DecimalField(
+        max_digits=18,
+        decimal_places=6,
+        verbose_name="Курс к базовой валюте",
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Курс валюты"
+        verbose_name_plural = "Курсы валют"
+        ordering = ["currency"]
+
+    def __str__(self):
+        return f"{self.currency}: {self.units_per_base}"
+
+
+class ListingNeighbor(models.Model):
+    """Precomputed similar listing: ``neighbor`` is the ``rank``-th closest to ``listing``."""
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="neighbors",
+        verbose_name="Объявление",
+    )
+    neighbor = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="neighbor_of",
+        verbose_name="Похожее объявление",
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    distance = models.FloatField(verbose_name="Расстояние")
+
+    class Meta:
+        verbose_name = "Похожее объявление"
+        verbose_name_plural = "Похожие объявления"
+        ordering = ["listing", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["listing", "rank"], name="unique_listing_neighbor_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} → {self.neighbor_id} (#{self.rank})"
@@ -0,0 +1,141 @@
+"""Precomputed "similar listings" for the detail page.
+
+``rebuild_neighbors`` loads every active listing into a feature matrix
+(price in the base currency, rooms, guests, housing type and amenities as
+one-hot columns, coordinates on the unit sphere), standardizes it and finds
+the ``NEIGHBORS_PER_LISTING`` nearest rows of each listing with NumPy, a
+block of rows at a time. Blocks are sized so their distance matrix and
+the scratch arrays it needs stay within ``CHUNK_MEMORY_BYTES`` whatever
+the number of listings. Listings in another city are pushed behind
+every same-city candidate, so other cities only fill in for small cities.
+The result replaces the ``ListingNeighbor`` table in one transaction.
+"""
+
+import math
+
+import numpy as np
+from django.db import transaction
+
+from .models import Listing, ListingNeighbor
+
+NEIGHBORS_PER_LISTING = 8
+CHUNK_MEMORY_BYTES = 256 * 1024 * 1024
+# Per distance: float32 value, bool city mask, int64 argpartition index.
+BYTES_PER_DISTANCE = 4 + 1 + 8
+INSERT_BATCH_SIZE = 5000
+
+# Relative importance of feature groups after standardization.
+WEIGHTS = {
+    "price": 2.0,
+    "rooms": 1.5,
+    "guests": 1.0,
+    "housing_type": 1.0,
+    "amenities": 0.5,
+    "coordinates": 3.0,
+}
+OTHER_CITY_PENALTY = 1e6
+
+
+def _standardize(column):
+    std = column.std()
+    return (column - column.mean()) / std if std > 0 else np.zeros_like(column)
+
+
+def feature_matrix():
+    """``(ids, city_codes, features)`` of active listings as NumPy arrays."""
+    rows = list(
+        Listing.objects.filter(is_active=True)
+        .order_by("id")
+        .values_list("id", "city_key", "price_base", "rooms", "max_guests", "housing_type", "latitude", "longitude")
+    )
+    n = len(rows)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+    if not n:
+        return ids, np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+    position = {pk: i for i, pk in enumerate(ids.tolist())}
+
+    cities = {}
+    city_codes = np.fromiter((cities.setdefault(r[1], len(cities)) for r in rows), dtype=np.int64, count=n)
+
+    price = np.array([float(r[2]) if r[2] is not None else np.nan for r in rows])
+    # No exchange rate: treat the price as typical rather than dropping the listing.
+    price = np.where(np.isnan(price), np.nanmedian(price) if np.isfinite(price).any() else 0.0, price)
+    columns = [
+        WEIGHTS["price"] * _standardize(np.log1p(price))[:, None],
+        WEIGHTS["rooms"] * _standardize(np.array([r[3] for r in rows], dtype=float))[:, None],
+        WEIGHTS["guests"] * _standardize(np.array([r[4] for r in rows], dtype=float))[:, None],
+    ]
+
+    housing_types = {value: i for i, value in enumerate(Listing.HousingType.values)}
+    housing = np.zeros((n, len(housing_types)))
+    housing[np.arange(n), [housing_types.get(r[5], 0) for r in rows]] = 1.0
+    columns.append(WEIGHTS["housing_type"] * housing)
+
+    amenity_pairs = list(
+        Listing.amenities.through.objects.filter(listing_id__in=position).values_list("listing_id", "amenity_id")
+    )
+    amenity_columns = {a: i for i, a in enumerate(sorted({a for _, a in amenity_pairs}))}
+    amenities = np.zeros((n, len(amenity_columns)))
+    for listing_id, amenity_id in amenity_pairs:
+        amenities[position[listing_id], amenity_columns[amenity_id]] = 1.0
+    columns.append(WEIGHTS["amenities"] * amenities)
+
+    # Unit vectors make the Euclidean distance grow with the great-circle one;
+    # listings without coordinates sit at the origin, equally far from all.
+    xyz = np.zeros((n, 3))
+    for i, r in enumerate(rows):
+        if r[6] is not None and r[7] is not None:
+            lat, lng = math.radians(float(r[6])), math.radians(float(r[7]))
+            xyz[i] = (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+    # 300 units per radian of arc: about one unit of distance per 20 km.
+    columns.append(WEIGHTS["coordinates"] * 100.0 * xyz)
+
+    return ids, city_codes, np.hstack(columns).astype(np.float32)
+
+
+def chunk_size_for(n) -> int:
+    return max(1, CHUNK_MEMORY_BYTES // (BYTES_PER_DISTANCE * max(n, 1)))
+
+
+def nearest_neighbors(features, city_codes, k=NEIGHBORS_PER_LISTING, chunk_size=None):
+    """Yield ``(row, neighbor_rows, distances)`` with the ``k`` nearest other rows of each row."""
+    n = features.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return
+    chunk_size = chunk_size or chunk_size_for(n)
+    squared = np.einsum("ij,ij->i", features, features)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        # |a - b|² = |a|² + |b|² - 2a·b, built in place in the float32 product.
+        distances = features[start:stop] @ features.T
+        distances *= -2.0
+        distances += squared[None, :]
+        distances += squared[start:stop, None]
+        np.maximum(distances, 0.0, out=distances)
+        other_city = city_codes[start:stop, None] != city_codes[None, :]
+        np.add(distances, OTHER_CITY_PENALTY, out=distances, where=other_city)
+        del other_city
+        distances[np.arange(stop - start), np.arange(start, stop)] = np.inf
+
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        nearest_distances = np.sqrt(np.take_along_axis(nearest_distances, order, axis=1))
+        for offset in range(stop - start):
+            yield start + offset, nearest[offset], nearest_distances[offset]
+
+
+def rebuild_neighbors(k=NEIGHBORS_PER_LISTING, chunk_size=None) -> int:
+    """Recompute the whole ``ListingNeighbor`` table; returns rows written."""
+    ids, city_codes, features = feature_matrix()
+    rows = [
+        ListingNeighbor(listing_id=int(ids[row]), neighbor_id=int(ids[col]), rank=rank, distance=float(distance))
+        for row, cols, dists in nearest_neighbors(features, city_codes, k, chunk_size)
+        for rank, (col, distance) in enumerate(zip(cols, dists), start=1)
+    ]
+    with transaction.atomic():
+        ListingNeighbor.objects.all().delete()
+        ListingNeighbor.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+    return len(rows)
@@ -0,0 +1,185 @@
+"""Keyset (cursor) pagination for listing lists.
+
+Opt-in with ``?pagination=cursor`` on the first page; later pages pass the
+``cursor`` returned by the previous one. Every supported sort orders by a
+single column with ``id`` as the tie-breaker, so a page is a ``WHERE (col,
+id) < (last_col, last_id)`` seek with ``LIMIT`` — no COUNT, no OFFSET.
+"""
+
+import base64
+import json
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import SORT_ALIASES
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _parse_decimal(value):
+    try:
+        parsed = Decimal(value)
+    except (TypeError, InvalidOperation):
+        raise InvalidCursor("bad decimal")
+    if not parsed.is_finite():
+        raise InvalidCursor("bad decimal")
+    return parsed
+
+
+def _parse_float(value):
+    parsed = float(value)
+    if not math.isfinite(parsed):
+        raise InvalidCursor("bad number")
+    return parsed
+
+
+def _parse_datetime(value):
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise InvalidCursor("bad datetime")
+    return parsed
+
+
+# sort name -> (field, descending, parse)
+KEYSET_SORTS = {
+    "date_new": ("created_at", True, _parse_datetime),
+    "date_old": ("created_at", False, _parse_datetime),
+    "price_asc": ("price_base", False, _parse_decimal),
+    "price_desc": ("price_base", True, _parse_decimal),
+    "rating_desc": ("avg_rating", True, _parse_float),
+    "rating_asc": ("avg_rating", False, _parse_float),
+    "reviews_desc": ("reviews_count", True, int),
+    "views_desc": ("_views_total", True, int),
+    "trending": ("_trending_score", True, _parse_float),
+}
+# Listings without a value here (no exchange rate, never viewed) are left out of keyset pages.
+NULLABLE_FIELDS = {"price_base", "_trending_score"}
+DEFAULT_SORT = "date_new"
+
+
+def wants_keyset(params) -> bool:
+    return "cursor" in params or params.get("pagination") == "cursor"
+
+
+def resolve_sort(sort, available=None):
+    sort = SORT_ALIASES.get(sort, sort)
+    if sort not in KEYSET_SORTS or (available is not None and sort not in available):
+        return DEFAULT_SORT
+    return sort
+
+
+def _dump(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(obj, sort) -> str:
+    """Cursor after ``obj``: a model instance or a ``values()`` dict with ``id``."""
+    field = KEYSET_SORTS[sort][0]
+    if isinstance(obj, dict):
+        value, pk = obj[field], obj["id"]
+    else:
+        value, pk = getattr(obj, field), obj.pk
+    raw = json.dumps([sort, _dump(value), pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor("malformed cursor")
+    if cursor_sort != sort or value is None or not isinstance(pk, int):
+        raise InvalidCursor("cursor does not match sort")
+    try:
+        return KEYSET_SORTS[sort][2](value), pk
+    except (ValueError, TypeError, OverflowError):
+        raise InvalidCursor("bad cursor value")
+
+
+def keyset_page(qs, sort, cursor, page_size):
+    """Return ``(items, next_cursor)`` for one keyset page of ``qs``."""
+    field, descending, _ = KEYSET_SORTS[sort]
+    prefix = "-" if descending else ""
+    qs = qs.order_by(f"{prefix}{field}", f"{prefix}id")
+    if field in NULLABLE_FIELDS:
+        qs = qs.filter(**{f"{field}__isnull": False})
+
+    if cursor:
+        value, pk = decode_cursor(cursor, sort)
+        op = "lt" if descending else "gt"
+        qs = qs.filter(Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": pk}))
+
+    items = list(qs[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1], sort)
+    return items, next_cursor
+
+
+class ListingKeysetPagination(BasePagination):
+    page_size = 10
+    max_page_size = 100
+
+    def get_sort(self, request, view=None):
+        available = getattr(view, "keyset_sorts", None)
+        return resolve_sort(request.query_params.get("sort", DEFAULT_SORT), available)
+
+    def get_sort_field(self, request, view=None):
+        """Column the cursor is built from; ``values()`` rows must include it."""
+        return KEYSET_SORTS[self.get_sort(request, view)][0]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        try:
+            page_size = int(params.get("page_size") or self.page_size)
+        except ValueError:
+            page_size = self.page_size
+        page_size = max(1, min(page_size, self.max_page_size))
+
+        self.sort = self.get_sort(request, view)
+        self.request = request
+        try:
+            items, self.next_cursor = keyset_page(
+                queryset, self.sort, params.get("cursor") or None, page_size
+            )
+        except InvalidCursor:
+            raise ValidationError({"cursor": "Некорректный или устаревший курсор."})
+        return items
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "pagination")
+        return replace_query_param(url, "cursor", self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "next_cursor": self.next_cursor,
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "next_cursor": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
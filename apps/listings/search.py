@@ -0,0 +1,321 @@
+"""One parsed, validated listing search shared by web, DRF and JSON search.
+
+``ListingSearchSpec.from_params`` reads the request parameters once and
+``build`` turns them into the canonical queryset: the same filters, in the
+same order, with the same sort expressions, whatever endpoint asked. That
+keeps the SQL to a small set of shapes (see ``shape``) which the indexes on
+``Listing`` are tuned for and which ``shape_sql`` caches for EXPLAIN checks.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+
+from .availability import exclude_unavailable
+from .fx import get_rates, to_base
+from .models import Listing, ListingViewStat, normalize_city
+from .search_index import apply_text_search
+
+SORT_ALIASES = {
+    "rating": "rating_desc",
+    "popular": "reviews_desc",
+}
+
+SORT_ORDERINGS = {
+    "relevance": ("-relevance", "-created_at"),
+    "date_new": ("-created_at",),
+    "date_old": ("created_at",),
+    "price_asc": ("price_base", "-created_at"),
+    "price_desc": ("-price_base", "-created_at"),
+    "rating_desc": ("-avg_rating", "-reviews_count", "-created_at"),
+    "rating_asc": ("avg_rating", "reviews_count", "-created_at"),
+    "reviews_desc": ("-reviews_count", "-avg_rating", "-created_at"),
+    "views_desc": ("-_views_total", "-created_at"),
+    "trending": ("-_trending_score", "-created_at"),
+}
+
+# Filter names in the order ``build`` applies them; ``shape`` lists the active ones.
+FILTERS = (
+    "q",
+    "city",
+    "country",
+    "district",
+    "housing_type",
+    "rooms_min",
+    "rooms_max",
+    "guests",
+    "currency",
+    "price_min",
+    "price_max",
+    "dates",
+    "amenities",
+    "instant_book",
+)
+
+TRUE_VALUES = ("1", "true", "on")
+
+
+def _to_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_decimal(v):
+    try:
+        return Decimal(v)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+
+
+def _text(params, *names):
+    for name in names:
+        value = str(params.get(name) or "").strip()
+        if value:
+            return value
+    return ""
+
+
+def views_total_annotation():
+    subq = (
+        ListingViewStat.objects
+        .filter(listing_id=OuterRef("pk"))
+        .values("views_total")[:1]
+    )
+    return Coalesce(Subquery(subq, output_field=IntegerField()), Value(0))
+
+
+def listings_with_amenities(amenity_ids):
+    """Subquery of listing ids that have every one of ``amenity_ids``.
+
+    One ``GROUP BY listing_id HAVING COUNT(*) = n`` over the M2M table, so the
+    cost does not grow with the number of selected amenities the way one join
+    per amenity does. (listing, amenity) pairs are unique in the through table.
+    """
+    amenity_ids = set(amenity_ids)
+    return (
+        Listing.amenities.through.objects
+        .filter(amenity_id__in=amenity_ids)
+        .values("listing_id")
+        .annotate(matched=Count("amenity_id"))
+        .filter(matched=len(amenity_ids))
+        .values("listing_id")
+    )
+
+
+class ListingSearchSpec:
+    """Parsed listing search parameters.
+
+    Unknown or malformed values are dropped; date problems are collected in
+    ``errors`` so strict callers (the API) can reject the request.
+    """
+
+    def __init__(
+        self,
+        q="",
+        city="",
+        country="",
+        district="",
+        housing_type="",
+        rooms_min=None,
+        rooms_max=None,
+        guests=None,
+        currency="",
+        price_min=None,
+        price_max=None,
+        date_from=None,
+        date_to=None,
+        amenity_ids=(),
+        instant_book=False,
+        display_currency="",
+        sort="date_new",
+        errors=None,
+    ):
+        self.q = q
+        self.city = city
+        self.country = country
+        self.district = district
+        self.housing_type = housing_type
+        self.rooms_min = rooms_min
+        self.rooms_max = rooms_max
+        self.guests = guests
+        self.currency = currency
+        self.price_min = price_min
+        self.price_max = price_max
+        self.date_from = date_from
+        self.date_to = date_to
+        self.amenity_ids = tuple(sorted(set(amenity_ids)))
+        self.instant_book = instant_book
+        self.display_currency = display_currency or settings.LISTING_BASE_CURRENCY
+        self.sort = sort
+        self.errors = errors or {}
+
+    @classmethod
+    def from_params(cls, params, default_sort="date_new"):
+        errors = {}
+
+        date_from = date_to = None
+        raw_from = _text(params, "date_from", "check_in")
+        raw_to = _text(params, "date_to", "check_out")
+        if raw_from and raw_to:
+            try:
+                df, dt = parse_date(raw_from), parse_date(raw_to)
+            except ValueError:  # well formed but not a real date, e.g. 2030-02-30
+                df = dt = None
+            if not df or not dt:
+                errors["date"] = "date_from и date_to должны быть в формате YYYY-MM-DD"
+            elif df >= dt:
+                errors["date"] = "date_from должен быть меньше date_to"
+            else:
+                date_from, date_to = df, dt
+
+        if hasattr(params, "getlist"):
+            raw_amenities = params.getlist("amenities")
+        else:
+            raw_amenities = [params.get("amenities")] if params.get("amenities") else []
+
+        display_currency = _text(params, "display_currency").upper()
+        if display_currency not in Listing.Currency.values:
+            display_currency = ""
+
+        q = _text(params, "q")
+        sort = str(params.get("sort") or default_sort)
+        sort = SORT_ALIASES.get(sort, sort)
+        if sort not in SORT_ORDERINGS or (sort == "relevance" and not q):
+            sort = SORT_ALIASES.get(default_sort, default_sort)
+
+        return cls(
+            q=q,
+            city=_text(params, "city"),
+            country=_text(params, "country"),
+            district=_text(params, "district"),
+            housing_type=_text(params, "housing_type"),
+            rooms_min=_to_int(params.get("rooms_min")),
+            rooms_max=_to_int(params.get("rooms_max")),
+            guests=_to_int(params.get("guests")),
+            currency=_text(params, "currency"),
+            price_min=_to_decimal(params.get("price_min")),
+            price_max=_to_decimal(params.get("price_max")),
+            date_from=date_from,
+            date_to=date_to,
+            amenity_ids=[int(x) for x in raw_amenities if str(x).isdigit()],
+            instant_book=params.get("instant_book") in TRUE_VALUES,
+            display_currency=display_currency,
+            sort=sort,
+            errors=errors,
+        )
+
+    def is_active(self, name) -> bool:
+        if name == "dates":
+            return self.date_from is not None
+        if name == "amenities":
+            return bool(self.amenity_ids)
+        value = getattr(self, name)
+        return value is not None and value != "" and value is not False
+
+    @property
+    def shape(self):
+        """Active filter names plus sort: specs with equal shapes produce the same SQL."""
+        return tuple(name for name in FILTERS if self.is_active(name)), self.sort
+
+    def build(self, qs=None):
+        """Apply the filters and the sort to ``qs`` (active listings by default)."""
+        if qs is None:
+            qs = Listing.objects.filter(is_active=True)
+
+        if self.q:
+            qs = apply_text_search(qs, self.q, rank=self.sort == "relevance")
+        if self.city:
+            qs = qs.filter(city_key=normalize_city(self.city))
+        if self.country:
+            qs = qs.filter(country__icontains=self.country)
+        if self.district:
+            qs = qs.filter(Q(street__icontains=self.district) | Q(postal_code__icontains=self.district))
+        if self.housing_type:
+            qs = qs.filter(housing_type=self.housing_type)
+        if self.rooms_min is not None:
+            qs = qs.filter(rooms__gte=self.rooms_min)
+        if self.rooms_max is not None:
+            qs = qs.filter(rooms__lte=self.rooms_max)
+        if self.guests is not None:
+            qs = qs.filter(max_guests__gte=self.guests)
+        if self.currency:
+            qs = qs.filter(currency=self.currency)
+        qs = self._filter_price(qs)
+        if self.date_from is not None:
+            qs = exclude_unavailable(qs, self.date_from, self.date_to)
+        if self.amenity_ids:
+            qs = qs.filter(pk__in=listings_with_amenities(self.amenity_ids))
+        if self.instant_book:
+            qs = qs.filter(instant_book=True)
+
+        if self.sort == "views_desc" and "_views_total" not in qs.query.annotations:
+            qs = qs.annotate(_views_total=views_total_annotation())
+        if self.sort == "trending" and "_trending_score" not in qs.query.annotations:
+            # Materialized by the view flush, so this is a join, not an aggregate.
+            qs = qs.annotate(_trending_score=F("view_stat__trending_score"))
+        return qs.order_by(*SORT_ORDERINGS[self.sort])
+
+
+    def _filter_price(self, qs):
+        """Filter by nightly price.
+
+        Within one ``currency`` the raw price is compared; otherwise bounds are
+        read in ``display_currency`` and compared with the indexed ``price_base``.
+        """
+        if self.price_min is None and self.price_max is None:
+            return qs
+        field, price_min, price_max = "price", self.price_min, self.price_max
+        if not self.currency:
+            rates = get_rates()
+            if self.display_currency in rates:
+                field = "price_base"
+                price_min = to_base(price_min, self.display_currency, rates)
+                price_max = to_base(price_max, self.display_currency, rates)
+        if price_min is not None:
+            qs = qs.filter(**{f"{field}__gte": price_min})
+        if price_max is not None:
+            qs = qs.filter(**{f"{field}__lte": price_max})
+        return qs
+
+
+def _sample_spec(shape):
+    filters, sort = shape
+    today = date.today()
+    values = {
+        "q": {"q": "sample"},
+        "city": {"city": "sample"},
+        "country": {"country": "sample"},
+        "district": {"district": "sample"},
+        "housing_type": {"housing_type": Listing.HousingType.APARTMENT},
+        "rooms_min": {"rooms_min": 1},
+        "rooms_max": {"rooms_max": 1},
+        "guests": {"guests": 1},
+        "currency": {"currency": Listing.Currency.EUR},
+        "price_min": {"price_min": Decimal("1")},
+        "price_max": {"price_max": Decimal("1")},
+        "dates": {"date_from": today, "date_to": today + timedelta(days=1)},
+        "amenities": {"amenity_ids": [1]},
+        "instant_book": {"instant_book": True},
+    }
+    kwargs = {"sort": sort}
+    for name in filters:
+        kwargs.update(values[name])
+    return ListingSearchSpec(**kwargs)
+
+
+@lru_cache(maxsize=256)
+def shape_sql(shape) -> str:
+    """SQL (with placeholders) of the canonical query for a search shape."""
+    sql, _ = _sample_spec(shape).build().query.sql_with_params()
+    return sql
+
+
+def explain_shape(shape) -> str:
+    return _sample_spec(shape).build().explain()
@@ -0,0 +1,149 @@
+"""Versioned cache of listing search results (page ids + total count).
+
+Cache keys embed a generation counter. Searches filtered by an exact
+``city`` use that city's generation, everything else uses the global one.
+Any change to a listing, booking, review or blocked date bumps the global
+generation and the generation of the affected city, so stale entries are
+never read again and simply expire.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.common import metrics
+
+from .models import Listing, normalize_city
+
+GLOBAL_SCOPE = "*"
+CASE_INSENSITIVE_PARAMS = {"q", "city", "country", "district"}
+IGNORED_PARAMS = {"page"}
+
+HITS_METRIC = "search_cache.hits"
+MISSES_METRIC = "search_cache.misses"
+
+
+def _generation_key(scope: str) -> str:
+    return "search:gen:" + hashlib.md5(scope.encode()).hexdigest()
+
+
+def current_generation(scope: str) -> int:
+    key = _generation_key(scope)
+    gen = cache.get(key)
+    if gen is None:
+        # A fresh starting point that cannot collide with keys written before eviction.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        gen = cache.get(key)
+    return gen
+
+
+def bump_generations(*cities) -> None:
+    scopes = {GLOBAL_SCOPE} | {normalize_city(c) for c in cities if normalize_city(c)}
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def invalidate_listing_search(listing_id=None, cities=()) -> None:
+    """Bump search generations once the current transaction commits.
+
+    Without explicit ``cities`` the listing's current city is looked up.
+    """
+    cities = list(cities)
+    if listing_id is not None and not cities:
+        cities = list(Listing.all_objects.filter(pk=listing_id).values_list("city", flat=True))
+    transaction.on_commit(lambda: bump_generations(*cities))
+
+
+def _normalized_params(params, ignore=IGNORED_PARAMS):
+    items = []
+    for key in sorted(params.keys()):
+        if key in ignore:
+            continue
+        values = params.getlist(key) if hasattr(params, "getlist") else [params.get(key)]
+        values = [str(v).strip() for v in values if v is not None and str(v).strip()]
+        if key in CASE_INSENSITIVE_PARAMS:
+            values = [" ".join(v.split()).casefold() for v in values]
+        if values:
+            items.append([key, sorted(values)])
+    return items
+
+
+def search_cache_key(namespace, params, ignore=IGNORED_PARAMS) -> str:
+    """Cache key for a search over ``params`` that changes with the search generation."""
+    scope = normalize_city(params.get("city")) or GLOBAL_SCOPE
+    payload = json.dumps(
+        [namespace, _normalized_params(params, ignore), scope, current_generation(scope)],
+        ensure_ascii=False,
+    )
+    return "search:res:" + hashlib.sha1(payload.encode()).hexdigest()
+
+
+class CachedSearchResults:
+    """Sequence over a filtered listing queryset with cached ids and count.
+
+    Behaves like a list for Django's ``Paginator``: ``count()`` and slicing
+    hit the cache first and only evaluate ``queryset`` on a miss. Cached ids
+    are turned back into objects through ``hydrate_queryset``.
+    """
+
+    def __init__(self, queryset, hydrate_queryset, namespace, params):
+        self.queryset = queryset
+        self.hydrate_queryset = hydrate_queryset
+        self.key = search_cache_key(namespace, params)
+        self.timeout = settings.LISTING_SEARCH_CACHE_TTL
+        self._count = None
+
+    def _cached(self, key, compute):
+        value = cache.get(key)
+        if value is not None:
+            metrics.incr(HITS_METRIC)
+            return value
+        metrics.incr(MISSES_METRIC)
+        value = compute()
+        cache.set(key, value, self.timeout)
+        return value
+
+    def count(self):
+        if self._count is None:
+            self._count = self._cached(f"{self.key}:count", self.queryset.count)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = min(item.stop if item.stop is not None else self.count(), self.count())
+        if stop <= start:
+            return []
+        ids = self._cached(
+            f"{self.key}:ids:{start}:{stop}",
+            lambda: list(self.queryset.values_list("pk", flat=True)[start:stop]),
+        )
+        return self.hydrate(ids)
+
+    def hydrate(self, ids):
+        """Turn a cached page of ids back into items, keeping their order."""
+        objects = self.hydrate_queryset.in_bulk(ids)
+        return [objects[pk] for pk in ids if pk in objects]
+
+
+def cache_stats() -> dict:
+    counters = metrics.get_counters(HITS_METRIC, MISSES_METRIC)
+    hits, misses = counters[HITS_METRIC], counters[MISSES_METRIC]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
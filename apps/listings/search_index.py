@@ -0,0 +1,167 @@
+"""Full-text search backends for the listing ``q`` parameter.
+
+The backend is picked once per process from ``settings.LISTING_SEARCH_BACKEND``:
+
+* ``auto`` — MySQL FULLTEXT on MySQL, FTS5 on SQLite, ``icontains`` otherwise;
+* ``fulltext`` — same as ``auto`` but never falls back silently;
+* ``icontains`` — the old OR of ``__icontains`` filters.
+"""
+
+import logging
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Listing
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ("title", "description", "city", "country", "street", "postal_code")
+
+FTS_TABLE = "listings_listing_fts"
+FULLTEXT_INDEX = "listings_listing_fulltext"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query) -> list[str]:
+    return _TOKEN_RE.findall(str(query or "").casefold())[:10]
+
+
+class BaseSearchBackend:
+    name = "base"
+
+    def filter(self, qs, query, rank=False):
+        """Restrict ``qs`` to listings matching ``query``.
+
+        With ``rank=True`` the queryset is annotated with ``relevance``.
+        """
+        raise NotImplementedError
+
+    def index_listing(self, listing):
+        pass
+
+    def remove_listing(self, listing_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    name = "icontains"
+
+    def filter(self, qs, query, rank=False):
+        query = str(query).strip()
+        cond = Q()
+        for field in SEARCH_FIELDS:
+            cond |= Q(**{f"{field}__icontains": query})
+        qs = qs.filter(cond)
+        if rank:
+            qs = qs.annotate(relevance=RawSQL("0", [], output_field=FloatField()))
+        return qs
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """MATCH ... AGAINST over a FULLTEXT index, maintained by InnoDB itself."""
+
+    name = "mysql_fulltext"
+    min_token_size = 3  # innodb_ft_min_token_size
+
+    def _match_sql(self):
+        table = connection.ops.quote_name(Listing._meta.db_table)
+        columns = ", ".join(
+            f"{table}.{connection.ops.quote_name(Listing._meta.get_field(f).column)}"
+            for f in SEARCH_FIELDS
+        )
+        return f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)"
+
+    def filter(self, qs, query, rank=False):
+        tokens = [t for t in tokenize(query) if len(t) >= self.min_token_size]
+        if not tokens:
+            return IcontainsSearchBackend().filter(qs, query, rank=rank)
+        expr = " ".join(f"+{t}*" for t in tokens)
+        return qs.annotate(
+            relevance=RawSQL(self._match_sql(), [expr], output_field=FloatField())
+        ).filter(relevance__gt=0)
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """External FTS5 table keyed by listing id, kept in sync by signals."""
+
+    name = "sqlite_fts5"
+
+    def filter(self, qs, query, rank=False):
+        tokens = tokenize(query)
+        if not tokens:
+            return qs.none()
+        expr = " ".join(f'"{t}"*' for t in tokens)
+        qs = qs.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expr])
+        )
+        if rank:
+            table = connection.ops.quote_name(Listing._meta.db_table)
+            qs = qs.annotate(
+                relevance=RawSQL(
+                    f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                    f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id)",
+                    [expr],
+                    output_field=FloatField(),
+                )
+            )
+        return qs
+
+    def index_listing(self, listing):
+        values = [getattr(listing, f) or "" for f in SEARCH_FIELDS]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [listing.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(SEARCH_FIELDS))})",
+                [listing.pk, *values],
+            )
+
+    def remove_listing(self, listing_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [listing_id])
+
+    def rebuild(self):
+        table = connection.ops.quote_name(Listing._meta.db_table)
+        columns = ", ".join(SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table}"
+            )
+
+
+def _fts5_table_exists():
+    with connection.cursor() as cursor:
+        return FTS_TABLE in connection.introspection.table_names(cursor)
+
+
+@lru_cache(maxsize=None)
+def _backend_for(choice, vendor):
+    if choice == "icontains":
+        return IcontainsSearchBackend()
+    if vendor == "mysql":
+        return MySQLFullTextBackend()
+    if vendor == "sqlite" and _fts5_table_exists():
+        return SQLiteFTS5Backend()
+    if choice == "fulltext":
+        raise RuntimeError(f"Full-text search is not available for database '{vendor}'")
+    logger.warning("No full-text index for database '%s', falling back to icontains search", vendor)
+    return IcontainsSearchBackend()
+
+
+def get_search_backend() -> BaseSearchBackend:
+    choice = getattr(settings, "LISTING_SEARCH_BACKEND", "auto")
+    return _backend_for(choice, connection.vendor)
+
+
+def apply_text_search(qs, query, rank=False):
+    return get_search_backend().filter(qs, query, rank=rank)
@@ -0,0 +1,111 @@
+"""Buffered logging of search queries.
+
+``record_search_query`` only appends to a Redis list and counts the query in
+the rolling top-K (see ``search_trends``); the ``flush_search_queries`` beat
+task copies the buffer into ``SearchQuery`` with ``bulk_create`` in batches
+and trims each batch off only once it is stored.
+The same visitor repeating the same query within
+``DEDUPE_TTL`` (paging, refreshing, changing the sort) is logged once. When
+Redis is unavailable the query is written straight to the database instead.
+"""
+
+import hashlib
+import json
+import logging
+
+import redis
+from redis.exceptions import LockError
+
+from apps.common.redis_client import get_redis_client
+
+from .models import SearchQuery
+from .search_trends import track_query
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = "search:log:buffer"
+DEDUPE_PREFIX = "search:log:seen:"
+DEDUPE_TTL = 30 * 60
+FLUSH_BATCH_SIZE = 1000
+FLUSH_LOCK_KEY = "search:log:flushing"
+FLUSH_LOCK_TTL = 5 * 60
+# One run writes at most this many batches; the rest waits for the next run.
+FLUSH_MAX_BATCHES = 50
+
+
+def visitor_id(request) -> str:
+    """Stable identity of whoever sent ``request``, used only for dedupe."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"u:{user.pk}"
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        return f"s:{session.session_key}"
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return "a:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _dedupe_key(visitor, query) -> str:
+    normalized = " ".join(query.split()).casefold()
+    return DEDUPE_PREFIX + hashlib.sha1(f"{visitor}\0{normalized}".encode()).hexdigest()
+
+
+def record_search_query(query, user=None, visitor=None) -> None:
+    query = (query or "").strip()[:255]
+    if not query:
+        return
+    user_id = user.pk if user is not None and user.is_authenticated else None
+
+    try:
+        r = get_redis_client()
+        if visitor and not r.set(_dedupe_key(visitor, query), 1, nx=True, ex=DEDUPE_TTL):
+            return
+        r.rpush(BUFFER_KEY, json.dumps({"q": query, "u": user_id}, ensure_ascii=False))
+    except redis.RedisError:
+        logger.warning("search log: redis unavailable, writing query directly", exc_info=True)
+        SearchQuery.objects.create(user_id=user_id, query=query)
+        return
+
+    try:
+        track_query(r, query)
+    except redis.RedisError:
+        logger.warning("search log: failed to update popular queries", exc_info=True)
+
+
+def flush_search_queries(batch_size=FLUSH_BATCH_SIZE, max_batches=FLUSH_MAX_BATCHES) -> int:
+    """Move buffered queries into the database; returns how many were written.
+
+    A batch is read with LRANGE and trimmed off the buffer only after its
+    INSERT succeeded, so a database error leaves it for the next run. The
+    lock keeps two overlapping runs from writing the same batch twice: it
+    holds a token released only by its owner (``redis.lock.Lock``), and a
+    run stops after ``max_batches`` so it ends well within the lock's TTL.
+    """
+    r = get_redis_client()
+    lock = r.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TTL, blocking=False)
+    if not lock.acquire():
+        return 0
+    written = 0
+    try:
+        for _ in range(max_batches):
+            raw = r.lrange(BUFFER_KEY, 0, batch_size - 1)
+            if not raw:
+                break
+            rows = []
+            for item in raw:
+                try:
+                    entry = json.loads(item)
+                    rows.append(SearchQuery(user_id=entry.get("u"), query=str(entry["q"])[:255]))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("search log: dropping malformed entry %r", item)
+            SearchQuery.objects.bulk_create(rows, batch_size=batch_size)
+            r.ltrim(BUFFER_KEY, len(raw), -1)
+            written += len(rows)
+            if len(raw) < batch_size:
+                break
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("search log: flush lock expired before the run finished")
+    return written
@@ -0,0 +1,70 @@
+"""Plain-dict rows for ``listings_search``.
+
+Search pages read only the columns the response needs with ``values()``
+instead of building ``Listing`` instances, and each row dict is turned into
+the response item in place (price as string, ISO date, address, display
+price), so a page costs one dict per listing.
+"""
+
+from .fx import from_base
+from .models import format_address
+from .search_cache import CachedSearchResults
+
+SEARCH_ROW_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "price",
+    "currency",
+    "rooms",
+    "housing_type",
+    "parking_type",
+    "country",
+    "city",
+    "postal_code",
+    "street",
+    "house_number",
+    "floor",
+    "apartment_number",
+    "created_at",
+    "avg_rating",
+    "reviews_count",
+    # Used for display_price and keyset cursors, not returned.
+    "price_base",
+)
+
+
+def search_row_values(qs):
+    return qs.values(*SEARCH_ROW_FIELDS)
+
+
+def build_search_rows(rows, display_currency, rates) -> list:
+    """Turn ``search_row_values`` dicts into response items, reusing each dict."""
+    rate = rates.get(display_currency)
+    for row in rows:
+        price_base = row.pop("price_base")
+        display_price = from_base(price_base, display_currency, rates) if rate else None
+        created_at = row["created_at"]
+
+        row["price"] = str(row["price"])
+        row["display_price"] = str(display_price) if display_price is not None else None
+        row["full_address"] = format_address(
+            row["country"],
+            row["city"],
+            row["postal_code"],
+            row["street"],
+            row["house_number"],
+            row["floor"],
+            row["apartment_number"],
+        )
+        row["created_at"] = created_at.isoformat() if created_at else None
+        row["avg_rating"] = float(row["avg_rating"])
+    return rows
+
+
+class CachedSearchRows(CachedSearchResults):
+    """``CachedSearchResults`` whose pages are ``search_row_values`` dicts."""
+
+    def hydrate(self, ids):
+        rows = {row["id"]: row for row in search_row_values(self.hydrate_queryset.filter(pk__in=ids))}
+        return [rows[pk] for pk in ids if pk in rows]
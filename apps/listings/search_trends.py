@@ -0,0 +1,131 @@
+"""Rolling top-K of search queries kept incrementally in Redis.
+
+Each logged query bumps an hourly and a daily bucket. A bucket is a
+count-min sketch (a fixed-size hash of counters) plus a sorted set of at most
+``BUCKET_SIZE`` candidates scored by their sketch estimate, so memory per
+bucket is bounded however many distinct queries arrive. Windows (24h, 7d,
+30d) are ``ZUNIONSTORE`` of their buckets, cached for ``UNION_TTL`` seconds,
+and reading the top K from the cached union is O(log N + K).
+"""
+
+import hashlib
+import logging
+from datetime import timedelta
+
+import redis
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.common.redis_client import get_redis_client
+
+from .models import SearchQuery
+
+logger = logging.getLogger(__name__)
+
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+BUCKET_SIZE = 1000
+UNION_TTL = 60
+
+HOURLY = ("h", "%Y%m%d%H", timedelta(hours=1), 26 * 3600)
+DAILY = ("d", "%Y%m%d", timedelta(days=1), 32 * 86400)
+WINDOWS = {
+    "24h": (HOURLY, 24),
+    "7d": (DAILY, 7),
+    "30d": (DAILY, 30),
+}
+DEFAULT_WINDOW = "7d"
+
+# KEYS: sketch hash, candidates zset. ARGV: member, ttl, bucket size, sketch fields...
+_TRACK_SCRIPT = """
+local estimate = nil
+for i = 4, #ARGV do
+    local v = redis.call('HINCRBY', KEYS[1], ARGV[i], 1)
+    if estimate == nil or v < estimate then estimate = v end
+end
+redis.call('ZADD', KEYS[2], estimate, ARGV[1])
+if redis.call('ZCARD', KEYS[2]) > tonumber(ARGV[3]) then
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, 0)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return estimate
+"""
+
+
+def normalize_query(query) -> str:
+    return " ".join(str(query or "").split()).casefold()[:255]
+
+
+def _sketch_fields(member):
+    digest = hashlib.blake2b(member.encode(), digest_size=4 * CMS_DEPTH).digest()
+    return [
+        f"{row}:{int.from_bytes(digest[row * 4:row * 4 + 4], 'big') % CMS_WIDTH}"
+        for row in range(CMS_DEPTH)
+    ]
+
+
+def _bucket_keys(granularity, moment):
+    name, fmt, _, _ = granularity
+    stamp = moment.strftime(fmt)
+    return f"search:top:{name}:{stamp}:cms", f"search:top:{name}:{stamp}"
+
+
+def track_query(r, query) -> None:
+    """Count one occurrence of ``query`` in the current hourly and daily buckets."""
+    member = normalize_query(query)
+    if not member:
+        return
+    script = r.register_script(_TRACK_SCRIPT)
+    fields = _sketch_fields(member)
+    now = timezone.now()
+    pipe = r.pipeline(transaction=False)
+    for granularity in (HOURLY, DAILY):
+        ttl = granularity[3]
+        script(keys=list(_bucket_keys(granularity, now)), args=[member, ttl, BUCKET_SIZE, *fields], client=pipe)
+    pipe.execute()
+
+
+def _top_from_redis(window, limit):
+    granularity, count = WINDOWS[window]
+    r = get_redis_client()
+    dest = f"search:top:w:{window}"
+    if not r.exists(dest):
+        now = timezone.now()
+        keys = [_bucket_keys(granularity, now - granularity[2] * i)[1] for i in range(count)]
+        pipe = r.pipeline()
+        pipe.zunionstore(dest, keys)
+        pipe.expire(dest, UNION_TTL)
+        pipe.execute()
+    return [
+        {"query": member, "cnt": int(score)}
+        for member, score in r.zrevrange(dest, 0, limit - 1, withscores=True)
+    ]
+
+
+def _top_from_db(window, limit):
+    granularity, count = WINDOWS[window]
+    since = timezone.now() - granularity[2] * count
+    return list(
+        SearchQuery.objects
+        .filter(created_at__gte=since)
+        .values("query")
+        .annotate(cnt=Count("id"))
+        .order_by("-cnt", "query")[:limit]
+    )
+
+
+def top_queries(window=DEFAULT_WINDOW, limit=20):
+    """Most popular queries in ``window`` as ``[{"query", "cnt"}]``.
+
+    Falls back to a ``created_at``-bounded GROUP BY when Redis is unavailable
+    or has no buckets yet (e.g. right after a deploy).
+    """
+    if window not in WINDOWS:
+        window = DEFAULT_WINDOW
+    try:
+        rows = _top_from_redis(window, limit)
+    except redis.RedisError:
+        logger.warning("search trends: redis unavailable, reading from the database", exc_info=True)
+        rows = []
+    return rows or _top_from_db(window, limit)
@@ -1,5 +1,9 @@
+from functools import cache
+
 from rest_framework import serializers
-from .models import Listing
+from rest_framework.exceptions import ValidationError
+
+from .models import Amenity, Listing, format_address
 
 
 class ListingSerializer(serializers.ModelSerializer):
@@ -10,8 +14,98 @@ class ListingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Listing
-        fields = "__all__"
+        exclude = ("rating_sum", "city_key", "geo_cell", "cache_version")
         read_only_fields = ("owner",)
 
     def get_full_address(self, obj):
         return obj.full_address()
+
+
+ADDRESS_FIELDS = ("country", "city", "postal_code", "street", "house_number", "floor", "apartment_number")
+# Output fields that are not a column of the same name.
+FIELD_COLUMNS = {
+    "full_address": ADDRESS_FIELDS,
+    "owner": ("owner_id",),
+    "amenities": (),
+}
+
+
+@cache
+def _list_fields():
+    """``ListingSerializer`` field names in output order, with converters for non-JSON types."""
+    fields = ListingSerializer().fields
+    converters = {
+        name: field.to_representation
+        for name, field in fields.items()
+        if isinstance(field, (serializers.DecimalField, serializers.DateTimeField))
+    }
+    return tuple(fields), converters
+
+
+class ListingRowListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        rows = list(data)
+        if "amenities" in self.child.field_names and rows:
+            amenities = {row["id"]: [] for row in rows}
+            for listing_id, amenity_id in (
+                Listing.amenities.through.objects
+                .filter(listing_id__in=amenities)
+                # Same order as ``listing.amenities.all()``.
+                .order_by("listing_id", *(f"amenity__{f}" for f in Amenity._meta.ordering), "amenity_id")
+                .values_list("listing_id", "amenity_id")
+            ):
+                amenities[listing_id].append(amenity_id)
+            for row in rows:
+                row["amenities"] = amenities[row["id"]]
+        return [self.child.to_representation(row) for row in rows]
+
+
+class ListingListSerializer(serializers.BaseSerializer):
+    """Read-only ``ListingSerializer`` output built from ``values()`` rows.
+
+    ``select()`` fetches only the columns needed for ``fields`` (all fields by
+    default, or a ``?fields=`` subset); amenities of a whole page come from
+    one query on the through table.
+    """
+
+    class Meta:
+        list_serializer_class = ListingRowListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        all_fields, converters = _list_fields()
+        self.field_names = tuple(f for f in all_fields if fields is None or f in fields)
+        self._converters = [(name, converters.get(name)) for name in self.field_names]
+
+    @staticmethod
+    def parse_fields(value):
+        """``?fields=`` as a set of field names, or ``None`` for all of them."""
+        if not value:
+            return None
+        requested = {f.strip() for f in value.split(",") if f.strip()}
+        unknown = requested - set(_list_fields()[0])
+        if unknown:
+            raise ValidationError({"fields": f"Неизвестные поля: {', '.join(sorted(unknown))}."})
+        return requested or None
+
+    @staticmethod
+    def select(qs, fields=None, extra=()):
+        """``values()`` of ``qs`` with the columns ``fields`` need plus ``extra``."""
+        columns = {"id": None}
+        for name in _list_fields()[0]:
+            if fields is None or name in fields:
+                columns.update(dict.fromkeys(FIELD_COLUMNS.get(name, (name,))))
+        columns.update(dict.fromkeys(extra))
+        return qs.values(*columns)
+
+    def to_representation(self, row):
+        out = {}
+        for name, convert in self._converters:
+            if name == "full_address":
+                out[name] = format_address(*(row[f] for f in ADDRESS_FIELDS))
+            elif name == "owner":
+                out[name] = row["owner_id"]
+            else:
+                value = row[name]
+                out[name] = convert(value) if convert is not None and value is not None else value
+        return out
@@ -1,124 +1,97 @@
 """Shared listing search and queryset helpers."""
 
-from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast
 
-from django.db.models import Avg, Count, Q, Value
-from django.db.models.functions import Coalesce
-from django.utils.dateparse import parse_date
-
-from .models import Listing, SearchQuery
-
-
-def _to_int(v):
-    try:
-        return int(v)
-    except (TypeError, ValueError):
-        return None
-
-
-def _to_decimal(v):
-    try:
-        return Decimal(v)
-    except (TypeError, ValueError, InvalidOperation):
-        return None
+from .models import Listing
+from .search import ListingSearchSpec
+from .search_log import record_search_query
 
 
 def base_listing_queryset():
     return (
-        Listing.objects.filter(is_active=True, is_deleted=False)
+        Listing.objects.filter(is_active=True)
         .select_related("owner")
         .prefetch_related("images", "amenities")
-        .annotate(
-            avg_rating=Coalesce(Avg("reviews__rating"), 0.0),
-            reviews_count=Count("reviews", distinct=True),
-        )
     )
 
 
-def filter_listings(qs, params, user=None):
-    q = params.get("q") or params.get("city")
-    if q:
-        q_clean = str(q).strip()
-        if q_clean:
-            SearchQuery.objects.create(
-                user=user if user and user.is_authenticated else None,
-                query=q_clean[:255],
-            )
-        qs = qs.filter(
-            Q(title__icontains=q_clean)
-            | Q(description__icontains=q_clean)
-            | Q(city__icontains=q_clean)
-            | Q(country__icontains=q_clean)
-            | Q(street__icontains=q_clean)
+def _avg_rating_expression():
+    return Case(
+        When(reviews_count=0, then=Value(0.0)),
+        default=Cast("rating_sum", FloatField()) / F("reviews_count"),
+        output_field=FloatField(),
+    )
+
+
+def apply_review_delta(listing_id, rating_delta, count_delta):
+    """Shift the stored rating sum/count of one listing and refresh its average."""
+    with transaction.atomic():
+        qs = Listing.all_objects.filter(pk=listing_id)
+        qs.update(
+            rating_sum=F("rating_sum") + rating_delta,
+            reviews_count=F("reviews_count") + count_delta,
+            cache_version=F("cache_version") + 1,
         )
+        qs.update(avg_rating=_avg_rating_expression())
 
-    country = params.get("country")
-    if country:
-        qs = qs.filter(country__icontains=country)
-
-    housing_type = params.get("housing_type")
-    if housing_type:
-        qs = qs.filter(housing_type=housing_type)
-
-    rooms_min = _to_int(params.get("rooms_min"))
-    if rooms_min is not None:
-        qs = qs.filter(rooms__gte=rooms_min)
-
-    guests = _to_int(params.get("guests"))
-    if guests is not None:
-        qs = qs.filter(max_guests__gte=guests)
-
-    price_min = _to_decimal(params.get("price_min"))
-    if price_min is not None:
-        qs = qs.filter(price__gte=price_min)
-
-    price_max = _to_decimal(params.get("price_max"))
-    if price_max is not None:
-        qs = qs.filter(price__lte=price_max)
-
-    currency = params.get("currency")
-    if currency:
-        qs = qs.filter(currency=currency)
-
-    date_from = params.get("date_from") or params.get("check_in")
-    date_to = params.get("date_to") or params.get("check_out")
-    if date_from and date_to:
-        df = parse_date(str(date_from))
-        dt = parse_date(str(date_to))
-        if df and dt and df < dt:
-            qs = qs.exclude(
-                bookings__date_from__lt=dt,
-                bookings__date_to__gt=df,
-                bookings__status__in=["pending", "approved"],
-            ).distinct()
-
-    amenity_ids = params.getlist("amenities") if hasattr(params, "getlist") else []
-    if not amenity_ids and params.get("amenities"):
-        amenity_ids = [params.get("amenities")]
-    amenity_ids = [int(x) for x in amenity_ids if str(x).isdigit()]
-    for aid in amenity_ids:
-        qs = qs.filter(amenities__id=aid)
-
-    if params.get("instant_book") in ("1", "true", "on"):
-        qs = qs.filter(instant_book=True)
-
-    sort = params.get("sort", "popular")
-    if sort == "price_asc":
-        qs = qs.order_by("price", "-created_at")
-    elif sort == "price_desc":
-        qs = qs.order_by("-price", "-created_at")
-    elif sort == "rating":
-        qs = qs.order_by("-avg_rating", "-reviews_count")
-    else:
-        qs = qs.order_by("-reviews_count", "-avg_rating", "-created_at")
-
-    return qs
+
+def recompute_listing_ratings(listing_ids):
+    """Rebuild stored rating columns from the reviews table for the given listings."""
+    from apps.reviews.models import Review
+
+    listing_ids = list(listing_ids)
+    totals = {
+        row["listing_id"]: (row["total"], row["cnt"])
+        for row in Review.objects.filter(listing_id__in=listing_ids)
+        .order_by()
+        .values("listing_id")
+        .annotate(total=Sum("rating"), cnt=Count("id"))
+    }
+
+    listings = list(
+        Listing.all_objects.filter(pk__in=listing_ids).only(
+            "id", "rating_sum", "reviews_count", "avg_rating"
+        )
+    )
+    for listing in listings:
+        total, cnt = totals.get(listing.pk, (0, 0))
+        listing.rating_sum = total
+        listing.reviews_count = cnt
+        listing.avg_rating = total / cnt if cnt else 0.0
+        listing.cache_version = F("cache_version") + 1
+
+    with transaction.atomic():
+        Listing.all_objects.bulk_update(
+            listings, ["rating_sum", "reviews_count", "avg_rating", "cache_version"]
+        )
+    return len(listings)
+
+
+def filter_listings(qs, params, user=None, visitor=None):
+    spec = ListingSearchSpec.from_params(params, default_sort="popular")
+    if spec.q:
+        record_search_query(spec.q, user, visitor)
+    return spec.build(qs)
 
 
 def similar_listings(listing, limit=4):
-    return (
+    """Nearest listings from the nightly ``ListingNeighbor`` table.
+
+    Listings created since the last rebuild have no rows yet and get the
+    best-rated listings of their city instead.
+    """
+    similar = list(
+        base_listing_queryset()
+        .filter(neighbor_of__listing=listing)
+        .order_by("neighbor_of__rank")[:limit]
+    )
+    if similar:
+        return similar
+    return list(
         base_listing_queryset()
-        .filter(city=listing.city)
+        .filter(city_key=listing.city_key)
         .exclude(pk=listing.pk)
         .order_by("-avg_rating")[:limit]
     )
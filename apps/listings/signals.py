@@ -3,10 +3,18 @@ import logging
 
 from django.core.mail import mail_admins
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Listing
+from apps.common.models import bulk_soft_delete_changed
+
+from .autocomplete import mark_stale as mark_autocomplete_stale
+from .availability import sync_blocked_date
+from .fx import clear_rates_cache, recompute_price_base
+from .models import ExchangeRate, Listing, ListingBlockedDate, ListingImage
+from .search_cache import invalidate_listing_search
+from .search_index import get_search_backend
 from .tasks import delete_listing_if_still_duplicate
 
 logger = logging.getLogger(__name__)
@@ -75,6 +83,99 @@ def notify_admin_on_create_and_duplicates(sender, instance: Listing, created: bo
             )
 
 
+@receiver(post_save, sender=Listing)
+def update_search_index_on_save(sender, instance: Listing, **kwargs):
+    get_search_backend().index_listing(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def update_search_index_on_delete(sender, instance: Listing, **kwargs):
+    get_search_backend().remove_listing(instance.pk)
+
+
+@receiver(post_save, sender=ListingBlockedDate)
+def update_availability_on_blocked_date(sender, instance: ListingBlockedDate, **kwargs):
+    sync_blocked_date(instance)
+    invalidate_listing_search(instance.listing_id)
+
+
+@receiver(post_delete, sender=ListingBlockedDate)
+def invalidate_search_on_blocked_date_delete(sender, instance: ListingBlockedDate, **kwargs):
+    invalidate_listing_search(instance.listing_id)
+
+
+# Fields the autocomplete index is built from.
+AUTOCOMPLETE_FIELDS = ("city", "country", "is_active", "is_deleted")
+
+
+@receiver(pre_save, sender=Listing)
+def remember_previous_city(sender, instance: Listing, **kwargs):
+    instance._previous_city = None
+    instance._previous_autocomplete = None
+    if instance.pk:
+        instance._previous_autocomplete = (
+            Listing.all_objects.filter(pk=instance.pk).values_list(*AUTOCOMPLETE_FIELDS).first()
+        )
+        if instance._previous_autocomplete:
+            instance._previous_city = instance._previous_autocomplete[0]
+
+
+@receiver(post_save, sender=Listing)
+def invalidate_search_on_listing_save(sender, instance: Listing, **kwargs):
+    invalidate_listing_search(cities=[instance.city, getattr(instance, "_previous_city", None)])
+    current = tuple(getattr(instance, f) for f in AUTOCOMPLETE_FIELDS)
+    if current != getattr(instance, "_previous_autocomplete", None):
+        transaction.on_commit(mark_autocomplete_stale)
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_search_on_listing_delete(sender, instance: Listing, **kwargs):
+    invalidate_listing_search(cities=[instance.city])
+    transaction.on_commit(mark_autocomplete_stale)
+
+
+def _cities_of(listing_ids):
+    return list(Listing.all_objects.filter(pk__in=listing_ids).values_list("city", flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=Listing.amenities.through)
+def invalidate_search_on_amenities_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidate_listing_search(cities=[instance.city])
+        return
+    # Changed from the amenity side: ``pk_set`` holds listing ids, except for
+    # clear(), whose listings have to be read before they are unlinked.
+    if action == "pre_clear":
+        instance._cleared_listing_cities = _cities_of(instance.listings.values("pk"))
+    elif action == "post_clear":
+        invalidate_listing_search(cities=getattr(instance, "_cleared_listing_cities", []))
+    elif action in ("post_add", "post_remove"):
+        invalidate_listing_search(cities=_cities_of(pk_set or ()))
+
+
+@receiver(bulk_soft_delete_changed, sender=Listing)
+def invalidate_search_on_bulk_soft_delete(sender, pks, **kwargs):
+    invalidate_listing_search(cities=_cities_of(pks))
+    transaction.on_commit(mark_autocomplete_stale)
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+def bump_card_version_on_image_change(sender, instance: ListingImage, **kwargs):
+    Listing.all_objects.filter(pk=instance.listing_id).update(cache_version=F("cache_version") + 1)
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def reprice_listings_on_rate_change(sender, instance: ExchangeRate, **kwargs):
+    clear_rates_cache()
+    recompute_price_base([instance.currency])
+    # Other processes may re-cache the old rate before this transaction commits.
+    transaction.on_commit(clear_rates_cache)
+    invalidate_listing_search()
+
+
 def _safe_mail_admins(subject: str, message: str):
     try:
         mail_admins(subject=subject, message=message, fail_silently=False)
@@ -1,11 +1,23 @@
-import re
+from datetime import date, timedelta
 
 from celery import shared_task
-from django.db import transaction
-from django.db.models import F
+from django.utils import timezone
 
 from apps.common.redis_client import get_redis_client
-from .models import Listing, ListingViewStat
+from .models import Listing
+from .home_sections import refresh_home_sections
+from .neighbors import rebuild_neighbors
+from .search_cache import invalidate_listing_search
+from .search_log import flush_search_queries
+from .view_events import ingest_view_events, purge_view_events, record_view_event
+from .view_stats import (
+    FOLD_DAYS,
+    SCAN_BATCH_SIZE,
+    flush_view_counters,
+    fold_unique_visitors,
+    prune_hourly_stats,
+    views_key,
+)
 
 
 def _duplicates_for_listing(listing: Listing):
@@ -48,15 +60,13 @@ def delete_listing_if_still_duplicate(listing_id: int):
 
     if hasattr(Listing, "_meta") and any(f.name == "is_deleted" for f in Listing._meta.fields):
         Listing.all_objects.filter(pk=listing_id, is_deleted=False).update(is_deleted=True)
+        invalidate_listing_search(listing_id)
         return {"ok": True, "deleted": True, "soft": True}
 
     Listing.all_objects.filter(pk=listing_id).delete()
     return {"ok": True, "deleted": True, "soft": False}
 
 
-KEY_RE = re.compile(r"^listing:(\d+):views$")
-
-
 @shared_task(bind=True, ignore_result=True)
 def track_listing_view(self, listing_id: int, user_id: int | None = None, owner_id: int | None = None) -> None:
 
@@ -64,71 +74,57 @@ def track_listing_view(self, listing_id: int, user_id: int | None = None, owner_
         return
 
     r = get_redis_client()
-    r.incr(f"listing:{listing_id}:views", 1)
+    r.incr(views_key(listing_id), 1)
 
 
 @shared_task(bind=True)
-def flush_listing_views_to_db(self, batch_size: int = 500) -> dict:
-
-    r = get_redis_client()
-
-    cursor = 0
-    listings_updated = 0
-    total_increment = 0
-    keys_found = 0
+def flush_listing_views_to_db(self, batch_size: int = SCAN_BATCH_SIZE) -> dict:
+    return flush_view_counters(batch_size)
 
-    while True:
-        cursor, keys = r.scan(cursor=cursor, match="listing:*:views", count=batch_size)
 
-        keys = [k for k in keys if KEY_RE.match(k)]
-        keys_found += len(keys)
+@shared_task
+def fold_listing_daily_stats(day: str | None = None) -> dict:
+    """Fold unique visitors and prune old hourly stats.
+
+    ``day`` is an ISO date; by default the last ``FOLD_DAYS`` finished days
+    are folded, which recounts visitors flushed after the previous fold.
+    """
+    if day:
+        days = [date.fromisoformat(day)]
+    else:
+        today = timezone.localdate()
+        days = [today - timedelta(days=n) for n in range(1, FOLD_DAYS + 1)]
+    result = {"days": [fold_unique_visitors(d) for d in days]}
+    result["hourly_rows_pruned"] = prune_hourly_stats()
+    return result
 
-        for key in keys:
-            m = KEY_RE.match(key)
-            if not m:
-                continue
 
-            listing_id = int(m.group(1))
+@shared_task
+def save_listing_view_event(listing_id: int, user_id: int):
+    record_view_event(listing_id, user_id)
+    return {"ok": True}
 
-            pipe = r.pipeline()
-            pipe.get(key)
-            pipe.delete(key)
-            value, _ = pipe.execute()
 
-            if not value:
-                continue
+@shared_task(ignore_result=True)
+def ingest_listing_view_events() -> int:
+    return ingest_view_events()
 
-            try:
-                delta = int(value)
-            except (TypeError, ValueError):
-                continue
 
-            with transaction.atomic():
-                ListingViewStat.objects.get_or_create(
-                    listing_id=listing_id,
-                    defaults={"views_total": 0},
-                )
-                ListingViewStat.objects.filter(listing_id=listing_id).update(
-                    views_total=F("views_total") + delta
-                )
+@shared_task(ignore_result=True)
+def purge_listing_view_events() -> int:
+    return purge_view_events()
 
-            listings_updated += 1
-            total_increment += delta
 
-        if cursor == 0:
-            break
+@shared_task(ignore_result=True)
+def flush_search_queries_to_db(batch_size: int = 1000) -> int:
+    return flush_search_queries(batch_size)
 
-    return {
-        "status": "ok",
-        "keys_found": keys_found,
-        "listings_updated": listings_updated,
-        "total_increment": total_increment,
-    }
 
+@shared_task(ignore_result=True)
+def rebuild_listing_neighbors() -> int:
+    return rebuild_neighbors()
 
-@shared_task
-def save_listing_view_event(listing_id: int, user_id: int):
 
-    from apps.listings.models import ListingViewEvent
-    ListingViewEvent.objects.create(listing_id=listing_id, user_id=user_id)
-    return {"ok": True}
+@shared_task(ignore_result=True)
+def refresh_home_page_sections() -> None:
+    refresh_home_sections()
@@ -0,0 +1,356 @@
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework.test import APIClient
+
+from apps.listings.models import Listing
+from apps.listings.search import FILTERS, SORT_ORDERINGS, ListingSearchSpec, explain_shape, shape_sql
+
+User = get_user_model()
+
+EXPECTED_INDEXES = {
+    "city": "city_key",
+    "dates": "listings_li_date_",
+    "amenities": "listings_listing_amenities",
+    "q": "listings_listing_fts",
+}
+SHAPES = [((name,), sort) for name in FILTERS for sort in SORT_ORDERINGS if sort != "relevance"] + [
+    (("q",), "relevance"),
+    (("city", "price_min", "dates"), "date_new"),
+    (("city", "housing_type", "guests", "amenities"), "price_asc"),
+    (("q", "city", "dates", "instant_book"), "reviews_desc"),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != "sqlite", reason="plans are asserted against SQLite")
+@pytest.mark.parametrize("shape", SHAPES, ids=lambda s: f"{'+'.join(s[0])}/{s[1]}")
+def test_search_shape_uses_indexes(shape):
+    plan = explain_shape(shape)
+
+    if shape[1] not in ("views_desc", "trending"):
+        # Sorting by the view statistics (a subquery, a joined table) has no listings index to walk;
+        # every other shape must avoid a bare table scan.
+        assert not any(line.endswith("SCAN listings_listing") for line in plan.splitlines()), plan
+    expected = EXPECTED_INDEXES.get(shape[0][0])
+    if expected and len(shape[0]) == 1:
+        assert expected in plan, plan
+
+
+def test_shape_groups_equivalent_params():
+    a = ListingSearchSpec.from_params({"city": "Berlin", "price_min": "10", "sort": "popular"})
+    b = ListingSearchSpec.from_params({"city": "Hamburg ", "price_min": "99.5", "sort": "reviews_desc"})
+    assert a.shape == b.shape == (("city", "price_min"), "reviews_desc")
+
+    bad = ListingSearchSpec.from_params({"date_from": "2030-01-05", "date_to": "2030-01-01", "sort": "relevance"})
+    assert "date" in bad.errors
+    assert bad.shape == ((), "date_new")
+
+
+@pytest.mark.django_db
+def test_shape_sql_is_cached():
+    shape_sql.cache_clear()
+    shape = (("city", "dates"), "price_asc")
+    assert shape_sql(shape) is shape_sql(shape)
+    assert shape_sql.cache_info().hits == 1
+
+
+@pytest.mark.django_db
+def test_api_endpoints_share_filters():
+    owner = User.objects.create_user(email="s@t.com", username="s", password="x", role="landlord")
+
+    def make(title, **kw):
+        data = dict(owner=owner, title=title, description="d", city="Berlin", street="Hauptstraße",
+                    price=Decimal("80"), rooms=2, max_guests=4, housing_type="apartment")
+        data.update(kw)
+        return Listing.objects.create(**data)
+
+    match = make("match", instant_book=True)
+    make("too many rooms", rooms=5, instant_book=True)
+    make("other district", street="Broadway", instant_book=True)
+    make("not instant")
+    make("other city", city="Paris", instant_book=True)
+
+    params = {"city": " berlin", "district": "haupt", "rooms_max": "3", "guests": "2", "instant_book": "1"}
+    client = APIClient()
+
+    api = client.get("/api/listings/", params).json()
+    api_ids = [row["id"] for row in api.get("results", api)]
+    search_ids = [row["id"] for row in client.get("/api/listings-search/", params).json()["results"]]
+
+    assert api_ids == search_ids == [match.pk]
+
+    bad = client.get("/api/listings/", {"date_from": "2030-01-05", "date_to": "2030-01-01"})
+    assert bad.status_code == 400
+
+
+@pytest.mark.django_db
+def test_amenity_filter_requires_all_in_one_subquery():
+    from apps.listings.models import Amenity
+
+    owner = User.objects.create_user(email="a@t.com", username="a", password="x", role="landlord")
+    wifi, kitchen, parking = (Amenity.objects.create(name=n) for n in ("wifi", "kitchen", "parking"))
+
+    def make(title, amenities):
+        listing = Listing.objects.create(owner=owner, title=title, description="d", city="Berlin",
+                                         price=Decimal("50"), rooms=1, housing_type="apartment")
+        listing.amenities.set(amenities)
+        return listing
+
+    full = make("full", [wifi, kitchen, parking])
+    make("partial", [wifi, kitchen])
+    make("none", [])
+
+    spec = ListingSearchSpec(amenity_ids=[wifi.pk, kitchen.pk, parking.pk])
+    qs = spec.build()
+    assert list(qs) == [full]
+    assert str(qs.query).count("listings_listing_amenities") == 1
+
+    assert set(ListingSearchSpec(amenity_ids=[wifi.pk]).build()) == set(Listing.objects.exclude(title="none"))
+
+
+@pytest.mark.django_db
+def test_map_search_by_radius_and_bbox():
+    from django.test import Client
+
+    from apps.listings.geo import cell_for
+
+    owner = User.objects.create_user(email="m@t.com", username="m", password="x", role="landlord")
+
+    def make(title, lat, lng):
+        return Listing.objects.create(owner=owner, title=title, description="d", price=Decimal("50"), rooms=1,
+                                      housing_type="apartment", latitude=Decimal(lat), longitude=Decimal(lng))
+
+    mitte = make("mitte", "52.520008", "13.404954")
+    kreuzberg = make("kreuzberg", "52.499000", "13.403000")
+    potsdam = make("potsdam", "52.390500", "13.064500")
+    make("paris", "48.856600", "2.352200")
+    assert mitte.geo_cell == cell_for(mitte.latitude, mitte.longitude)
+
+    client = Client()
+    near = client.get("/api/listings-map/", {"lat": "52.52", "lng": "13.405", "radius_km": "5"}).json()
+    assert [r["id"] for r in near["results"]] == [mitte.pk, kreuzberg.pk]
+    assert near["results"][0]["distance_km"] < near["results"][1]["distance_km"] < 5
+
+    box = client.get("/api/listings-map/", {"bbox": "52.3,13.0,52.6,13.5"}).json()
+    assert {r["id"] for r in box["results"]} == {mitte.pk, kreuzberg.pk, potsdam.pk}
+
+    assert client.get("/api/listings-map/", {"bbox": "91,0,92,1"}).status_code == 400
+    for check_in, check_out in (("2030-01-05", "2030-01-01"), ("2030-02-30", "2030-03-02"), ("soon", "later")):
+        response = client.get("/api/listings-map/", {"bbox": "52.3,13.0,52.6,13.5",
+                                                     "check_in": check_in, "check_out": check_out})
+        assert response.status_code == 400 and "date" in response.json()
+
+
+@pytest.fixture
+def fx_rates():
+    from apps.listings.fx import clear_rates_cache
+
+    clear_rates_cache()
+    yield
+    clear_rates_cache()
+
+
+@pytest.mark.django_db
+def test_price_base_filters_and_sorts_across_currencies(fx_rates, django_capture_on_commit_callbacks):
+    from apps.listings.fx import get_rates, load_rates
+
+    load_rates("EUR", {"EUR": "1", "USD": "2", "RUB": "100", "UAH": "40"})
+    owner = User.objects.create_user(email="fx@t.com", username="fx", password="x", role="landlord")
+
+    def make(title, price, currency):
+        return Listing.objects.create(owner=owner, title=title, description="d", price=Decimal(price),
+                                      currency=currency, rooms=1, housing_type="apartment")
+
+    eur = make("eur", "50", "EUR")
+    usd = make("usd", "80", "USD")
+    rub = make("rub", "7000", "RUB")
+    assert (eur.price_base, usd.price_base, rub.price_base) == (Decimal("50.00"), Decimal("40.00"), Decimal("70.00"))
+
+    spec = ListingSearchSpec.from_params({"price_min": "45", "price_max": "60", "sort": "price_asc"})
+    assert list(spec.build()) == [eur]
+
+    in_usd = ListingSearchSpec.from_params({"price_max": "100", "display_currency": "usd", "sort": "price_asc"})
+    assert list(in_usd.build()) == [usd, eur]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert load_rates("EUR", {"USD": "1"}) == ["USD"]
+    usd.refresh_from_db()
+    assert usd.price_base == Decimal("80.00")
+    assert get_rates()["USD"] == Decimal("1")
+
+    with pytest.raises(ValueError):
+        load_rates("USD", {"EUR": "1"})
+
+
+@pytest.mark.django_db
+def test_search_log_falls_back_to_direct_insert_without_redis(monkeypatch):
+    from apps.listings.models import SearchQuery
+    from apps.listings.search_log import record_search_query
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    record_search_query("  Berlin loft ", visitor="u:1")
+    record_search_query("   ", visitor="u:1")
+
+    assert list(SearchQuery.objects.values_list("query", flat=True)) == ["Berlin loft"]
+
+
+@pytest.mark.django_db
+def test_popular_searches_window_without_redis(monkeypatch):
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from apps.listings.models import SearchQuery
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    for query, count in (("berlin", 3), ("paris", 2)):
+        SearchQuery.objects.bulk_create(SearchQuery(query=query) for _ in range(count))
+    old = SearchQuery.objects.bulk_create(SearchQuery(query="paris") for _ in range(5))
+    SearchQuery.objects.filter(pk__in=[q.pk for q in old]).update(created_at=timezone.now() - timedelta(days=3))
+
+    client = APIClient()
+    day = client.get("/api/listings/search/popular/", {"window": "24h"}).json()
+    week = client.get("/api/listings/search/popular/", {"window": "7d", "limit": 1}).json()
+
+    assert day == [{"query": "berlin", "cnt": 3}, {"query": "paris", "cnt": 2}]
+    assert week == [{"query": "paris", "cnt": 7}]
+
+
+@pytest.mark.django_db
+def test_autocomplete_prefix_index(monkeypatch, django_capture_on_commit_callbacks):
+    from apps.listings.models import SearchQuery
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    owner = User.objects.create_user(email="ac@t.com", username="ac", password="x", role="landlord")
+
+    def make(city, country):
+        with django_capture_on_commit_callbacks(execute=True):
+            Listing.objects.create(owner=owner, title="t", description="d", city=city, country=country,
+                                   price=Decimal("50"), rooms=1, housing_type="apartment")
+
+    make("Москва", "Россия")
+    make("москва ", "Россия")
+    make("Мурманск", "Россия")
+    make("Орёл", "Россия")
+    make("New York", "USA")
+    SearchQuery.objects.create(query="москва центр")
+
+    client = APIClient()
+
+    def values(prefix):
+        return [(r["value"], r["type"], r["count"]) for r in client.get(
+            "/api/listings/autocomplete/", {"prefix": prefix}).json()["results"]]
+
+    assert values("МО") == [("Москва", "city", 2), ("москва центр", "query", 1)]
+    assert values("м")[:3] == [("Москва", "city", 2), ("Мурманск", "city", 1), ("москва центр", "query", 1)]
+    assert values("орел") == [("Орёл", "city", 1)]
+    assert values("york") == [("New York", "city", 1)]
+    assert values("росс") == [("Россия", "country", 4)]
+    assert values("") == []
+
+    from apps.listings.autocomplete import current_version
+
+    listing = Listing.objects.get(city="Мурманск")
+    version = current_version()
+    with django_capture_on_commit_callbacks(execute=True):
+        listing.price = Decimal("60")
+        listing.save()
+    assert current_version() == version
+    with django_capture_on_commit_callbacks(execute=True):
+        listing.city = "Мурманск-2"
+        listing.save()
+    assert current_version() != version
+
+
+@pytest.mark.django_db
+def test_facets_for_filtered_set(django_assert_max_num_queries):
+    from apps.listings.facets import compute_facets
+    from apps.listings.models import Amenity
+
+    owner = User.objects.create_user(email="fc@t.com", username="fc", password="x", role="landlord")
+    wifi = Amenity.objects.create(name="wifi")
+
+    def make(city, housing_type, rooms, price):
+        return Listing.objects.create(owner=owner, title="t", description="d", city=city, currency="EUR",
+                                      price=Decimal(price), rooms=rooms, housing_type=housing_type)
+
+    make("Berlin", "apartment", 1, "30").amenities.add(wifi)
+    make("Berlin", "apartment", 2, "80").amenities.add(wifi)
+    make("Berlin", "house", 5, "600")
+    make("Paris", "room", 1, "40").amenities.add(wifi)
+
+    spec = ListingSearchSpec.from_params({"city": "berlin"})
+    with django_assert_max_num_queries(4):
+        facets = compute_facets(spec)
+
+    assert facets["total"] == 3
+    assert {h["value"]: h["count"] for h in facets["housing_type"]} == {"apartment": 2, "house": 1, "room": 0}
+    assert {r["value"]: r["count"] for r in facets["rooms"]} == {"1": 1, "2": 1, "3": 0, "4+": 1}
+    assert [(b["from"], b["count"]) for b in facets["price"]["buckets"] if b["count"]] == [
+        ("25", 1), ("75", 1), ("500", 1)
+    ]
+    assert facets["amenities"] == [{"id": wifi.pk, "name": "wifi", "count": 2}]
+
+    response = APIClient().get("/api/listings/facets/", {"city": "berlin", "housing_type": "apartment"})
+    assert response.json()["total"] == 2
+
+
+@pytest.mark.django_db
+def test_listings_search_rows_from_values(fx_rates):
+    from apps.listings.fx import load_rates
+
+    load_rates("EUR", {"EUR": "1", "USD": "2"})
+    owner = User.objects.create_user(email="r@t.com", username="r", password="x", role="landlord")
+    first = Listing.objects.create(owner=owner, title="Тихая", description="d", city="Berlin", street="Hauptstraße",
+                                   house_number="5", floor="2", price=Decimal("80"), currency="USD", rooms=2,
+                                   housing_type="apartment")
+    second = Listing.objects.create(owner=owner, title="second", description="d", price=Decimal("30"),
+                                    rooms=1, housing_type="room")
+    client = APIClient()
+
+    body = client.get("/api/listings-search/", {"sort": "date_old", "display_currency": "USD"}).json()
+    row = body["results"][0]
+    assert [r["id"] for r in body["results"]] == [first.pk, second.pk]
+    assert row["title"] == "Тихая"
+    assert row["price"] == "80.00" and row["display_price"] == "80.00"
+    assert row["full_address"] == first.full_address() == "Berlin, Hauptstraße, 5, этаж 2"
+    assert row["created_at"] == first.created_at.isoformat()
+    assert "price_base" not in row
+
+    page = client.get("/api/listings-search/", {"sort": "price_asc", "pagination": "cursor", "page_size": 1}).json()
+    assert [r["id"] for r in page["results"]] == [second.pk]
+    page = client.get("/api/listings-search/", {"sort": "price_asc", "cursor": page["next_cursor"]}).json()
+    assert [r["id"] for r in page["results"]] == [first.pk]
+
+
+@pytest.mark.django_db
+def test_listing_list_rows_match_model_serializer(django_assert_max_num_queries):
+    from apps.listings.models import Amenity
+    from apps.listings.serializers import ListingSerializer
+
+    owner = User.objects.create_user(email="l@t.com", username="l", password="x", role="landlord")
+    wifi, kitchen = Amenity.objects.create(name="wifi"), Amenity.objects.create(name="kitchen")
+    for i in range(3):
+        listing = Listing.objects.create(owner=owner, title=f"flat {i}", description="d", city="Berlin",
+                                         street="Hauptstraße", price=Decimal("80.5"), rooms=2,
+                                         latitude=Decimal("52.52"), longitude=Decimal("13.405"),
+                                         housing_type="apartment")
+        listing.amenities.set([wifi, kitchen][:i])
+    client = APIClient()
+
+    with django_assert_max_num_queries(3):
+        results = client.get("/api/listings/", {"sort": "date_old"}).json()["results"]
+    expected = ListingSerializer(Listing.objects.order_by("created_at", "id"), many=True).data
+    assert results == [dict(row) for row in expected]
+
+    popular = client.get("/api/listings/popular/", {"fields": "id,full_address,amenities"}).json()
+    assert popular[0].keys() == {"id", "full_address", "amenities"}
+    assert popular[0]["full_address"] == "Berlin, Hauptstraße"
+
+    page = client.get("/api/listings/", {"fields": "title", "pagination": "cursor", "page_size": 2}).json()
+    assert [row.keys() for row in page["results"]] == [{"title"}, {"title"}] and page["next_cursor"]
+
+    assert client.get("/api/listings/", {"fields": "title,secret"}).status_code == 400
@@ -31,3 +31,371 @@ def test_filter_by_city():
     )
     qs = filter_listings(base_listing_queryset(), {"q": "Moscow"})
     assert qs.count() == 1
+
+
+@pytest.mark.django_db
+def test_review_updates_stored_rating():
+    from datetime import date
+
+    from apps.bookings.models import Booking
+    from apps.reviews.models import Review
+
+    owner = User.objects.create_user(email="o2@t.com", username="o2", password="x", role="landlord")
+    tenant = User.objects.create_user(email="t2@t.com", username="t2", password="x", role="tenant")
+    listing = Listing.objects.create(
+        owner=owner,
+        title="Berlin flat",
+        description="d",
+        city="Berlin",
+        price=Decimal("50"),
+        rooms=1,
+        housing_type="apartment",
+    )
+    reviews = []
+    for i, rating in enumerate((5, 2)):
+        booking = Booking.objects.create(
+            listing=listing,
+            tenant=tenant,
+            date_from=date(2026, 1, 1 + i * 5),
+            date_to=date(2026, 1, 3 + i * 5),
+            status=Booking.Status.COMPLETED,
+        )
+        reviews.append(
+            Review.objects.create(listing=listing, booking=booking, author=tenant, rating=rating)
+        )
+
+    listing.refresh_from_db()
+    assert (listing.rating_sum, listing.reviews_count, listing.avg_rating) == (7, 2, 3.5)
+
+    reviews[0].delete()
+    listing.refresh_from_db()
+    assert (listing.rating_sum, listing.reviews_count, listing.avg_rating) == (2, 1, 2.0)
+
+
+@pytest.mark.django_db
+def test_text_search_prefix_and_relevance_sort():
+    user = User.objects.create_user(email="o3@t.com", username="o3", password="x", role="landlord")
+    for title, city in (("Loft", "Москва"), ("Москва центр", "Москва"), ("Flat", "Paris")):
+        Listing.objects.create(
+            owner=user,
+            title=title,
+            description="d",
+            city=city,
+            price=Decimal("50"),
+            rooms=1,
+            housing_type="apartment",
+        )
+    qs = filter_listings(base_listing_queryset(), {"q": "моск", "sort": "relevance"})
+    assert [x.title for x in qs] == ["Москва центр", "Loft"]
+
+
+@pytest.mark.django_db
+def test_search_cache_invalidated_by_listing_change(django_capture_on_commit_callbacks):
+    from django.core.cache import cache
+
+    from apps.listings.search_cache import CachedSearchResults
+
+    cache.clear()
+    user = User.objects.create_user(email="o4@t.com", username="o4", password="x", role="landlord")
+    params = {"city": "Lyon"}
+
+    def search():
+        qs = filter_listings(base_listing_queryset(), params)
+        return CachedSearchResults(qs, base_listing_queryset(), "test", params)
+
+    assert search().count() == 0
+    with django_capture_on_commit_callbacks(execute=True):
+        listing = Listing.objects.create(
+            owner=user,
+            title="Lyon flat",
+            description="d",
+            city="Lyon",
+            price=Decimal("50"),
+            rooms=1,
+            housing_type="apartment",
+        )
+    results = search()
+    assert results.count() == 1
+    assert [x.pk for x in results[0:10]] == [listing.pk]
+
+    Listing.objects.filter(pk=listing.pk).update(is_active=False)
+    assert search().count() == 1  # no signal, still served from cache
+
+
+@pytest.mark.django_db
+def test_search_cache_invalidated_by_amenity_side_and_bulk_soft_delete(django_capture_on_commit_callbacks):
+    from django.core.cache import cache
+
+    from apps.listings.models import Amenity
+    from apps.listings.search_cache import current_generation
+
+    cache.clear()
+    user = User.objects.create_user(email="o6@t.com", username="o6", password="x", role="landlord")
+    listing = Listing.objects.create(owner=user, title="Nice flat", description="d", city="Nice",
+                                     price=Decimal("50"), rooms=1, housing_type="apartment")
+    wifi = Amenity.objects.create(name="wifi")
+
+    def bumped(action):
+        before = current_generation("nice")
+        with django_capture_on_commit_callbacks(execute=True):
+            action()
+        return current_generation("nice") != before
+
+    assert bumped(lambda: wifi.listings.add(listing))
+    assert bumped(lambda: wifi.listings.clear())
+    assert bumped(lambda: Listing.objects.filter(pk=listing.pk).delete())
+    assert Listing.all_objects.get(pk=listing.pk).is_deleted
+    assert bumped(lambda: Listing.all_objects.filter(pk=listing.pk).restore())
+
+
+@pytest.mark.django_db
+def test_keyset_pages_are_stable_with_ties():
+    from apps.listings.pagination import keyset_page
+
+    user = User.objects.create_user(email="o5@t.com", username="o5", password="x", role="landlord")
+    created = [
+        Listing.objects.create(
+            owner=user,
+            title=f"Flat {i}",
+            description="d",
+            city="Rome",
+            price=Decimal(50 + i % 2),
+            rooms=1,
+            housing_type="apartment",
+        ).pk
+        for i in range(7)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        items, cursor = keyset_page(base_listing_queryset(), "price_asc", cursor, 3)
+        seen.extend(x.pk for x in items)
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(created)
+    assert len(seen) == len(set(seen))
+
+
+@pytest.mark.parametrize("sort, value", [
+    ("rating_desc", "abc"),
+    ("rating_desc", "NaN"),
+    ("reviews_desc", [1]),
+    ("date_new", "2026-13-45T10:00:00"),
+    ("price_asc", "NaN"),
+    ("price_asc", "Infinity"),
+])
+def test_tampered_cursor_is_invalid(sort, value):
+    import base64
+    import json
+
+    from apps.listings.pagination import InvalidCursor, decode_cursor
+
+    cursor = base64.urlsafe_b64encode(json.dumps([sort, value, 1]).encode()).decode()
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, sort)
+
+
+@pytest.mark.django_db
+def test_similar_listings_from_neighbor_table():
+    from apps.listings.models import ListingNeighbor
+    from apps.listings.neighbors import rebuild_neighbors
+    from apps.listings.services import similar_listings
+
+    user = User.objects.create_user(email="n@t.com", username="n", password="x", role="landlord")
+
+    def make(title, city, price, rooms, lat, lng):
+        return Listing.objects.create(owner=user, title=title, description="d", city=city, price=Decimal(price),
+                                      rooms=rooms, housing_type="apartment",
+                                      latitude=Decimal(lat), longitude=Decimal(lng))
+
+    base = make("base", "Berlin", "80", 2, "52.52", "13.40")
+    close = make("close", "Berlin", "85", 2, "52.53", "13.41")
+    far = make("far", "Berlin", "400", 5, "52.40", "13.10")
+    other_city = make("same but Paris", "Paris", "80", 2, "48.85", "2.35")
+
+    assert rebuild_neighbors(k=2) == 8
+    assert [x.title for x in similar_listings(base, limit=2)] == [close.title, far.title]
+    # A city with one listing borrows neighbors from elsewhere.
+    assert ListingNeighbor.objects.filter(listing=other_city).count() == 2
+
+    fresh = make("fresh", "Berlin", "90", 2, "52.52", "13.40")
+    assert set(similar_listings(fresh)) == {base, close, far}
+
+
+@pytest.mark.django_db
+def test_view_totals_upsert_adds_to_existing_rows():
+    from apps.listings.models import ListingViewStat
+    from apps.listings.view_stats import upsert_view_totals
+
+    user = User.objects.create_user(email="v@t.com", username="v", password="x", role="landlord")
+    a, b = (
+        Listing.objects.create(owner=user, title=t, description="d", price=Decimal("50"), rooms=1,
+                               housing_type="apartment")
+        for t in ("a", "b")
+    )
+    ListingViewStat.objects.create(listing=a, views_total=10)
+
+    assert upsert_view_totals({a.pk: 3, b.pk: 4, 999999: 5}) == 2
+    assert upsert_view_totals({b.pk: 1}) == 1
+    assert dict(ListingViewStat.objects.values_list("listing_id", "views_total")) == {a.pk: 13, b.pk: 5}
+
+
+@pytest.mark.django_db
+def test_detail_views_counted_locally_while_redis_is_down(monkeypatch):
+    from rest_framework.test import APIClient
+
+    from apps.listings import view_counter
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(view_counter, "counter", view_counter.ViewCounter())
+    monkeypatch.setattr(view_counter, "FLUSH_EVERY_VIEWS", 2)
+
+    owner = User.objects.create_user(email="vc@t.com", username="vc", password="x", role="landlord")
+    listing = Listing.objects.create(owner=owner, title="t", description="d", price=Decimal("50"), rooms=1,
+                                     housing_type="apartment")
+
+    client = APIClient()
+    for _ in range(3):
+        assert client.get(f"/api/listings/{listing.pk}/").status_code == 200
+    client.force_authenticate(owner)
+    client.get(f"/api/listings/{listing.pk}/")
+
+    # After a failed flush every anonymous view is still pending; the owner's is not counted.
+    assert view_counter.counter.pending() == {listing.pk: 3}
+    assert view_counter.counter.flush() == 0
+    assert view_counter.counter.pending() == {listing.pk: 3}
+    # The same anonymous client is one visitor.
+    assert [len(v) for v in view_counter.counter.pending_visitors().values()] == [1]
+
+
+def test_view_counter_backs_off_after_a_failed_flush(monkeypatch):
+    from apps.listings import view_counter
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(view_counter, "FLUSH_EVERY_VIEWS", 1)
+    calls = []
+    real_get_pipeline = view_counter.get_pipeline
+    monkeypatch.setattr(view_counter, "get_pipeline", lambda: calls.append(1) or real_get_pipeline())
+    counter = view_counter.ViewCounter()
+
+    counter.record(1)
+    assert calls == [1]
+    # Redis is still down: later views are only kept, the request does not try again.
+    counter.record(1)
+    counter.record(2)
+    assert calls == [1]
+    assert counter.pending() == {1: 2, 2: 1}
+
+
+@pytest.mark.django_db
+def test_unique_visitors_upsert_overwrites_the_day():
+    import datetime
+
+    from apps.listings.models import ListingDailyStat
+    from apps.listings.view_stats import upsert_unique_visitors
+
+    user = User.objects.create_user(email="uv@t.com", username="uv", password="x", role="landlord")
+    listing = Listing.objects.create(owner=user, title="t", description="d", price=Decimal("50"), rooms=1,
+                                     housing_type="apartment")
+    day = datetime.date(2026, 1, 2)
+
+    assert upsert_unique_visitors(day, {listing.pk: 5, 999999: 1}) == 1
+    # A retried fold recounts the same HyperLogLog, so the value is replaced, not added.
+    assert upsert_unique_visitors(day, {listing.pk: 6}) == 1
+    assert list(ListingDailyStat.objects.values_list("listing_id", "date", "unique_visitors")) == [
+        (listing.pk, day, 6)
+    ]
+
+
+@pytest.mark.django_db
+def test_view_event_written_directly_while_redis_is_down(monkeypatch):
+    from apps.listings.models import ListingViewEvent
+    from apps.listings.view_events import record_view_event
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    user = User.objects.create_user(email="ve@t.com", username="ve", password="x", role="landlord")
+    listing = Listing.objects.create(owner=user, title="t", description="d", price=Decimal("50"), rooms=1,
+                                     housing_type="apartment")
+
+    record_view_event(listing.pk, user.pk)
+    assert list(ListingViewEvent.objects.values_list("listing_id", "user_id")) == [(listing.pk, user.pk)]
+
+
+@pytest.mark.django_db
+def test_purge_view_events_deletes_only_old_rows_in_chunks():
+    import datetime
+
+    from django.utils import timezone
+
+    from apps.listings.models import ListingViewEvent
+    from apps.listings.view_events import purge_view_events
+
+    user = User.objects.create_user(email="pe@t.com", username="pe", password="x", role="landlord")
+    listing = Listing.objects.create(owner=user, title="t", description="d", price=Decimal("50"), rooms=1,
+                                     housing_type="apartment")
+    now = timezone.now()
+    ListingViewEvent.objects.bulk_create(
+        [ListingViewEvent(listing=listing, user=user, created_at=now - datetime.timedelta(days=40)) for _ in range(5)]
+        + [ListingViewEvent(listing=listing, user=user, created_at=now)]
+    )
+
+    assert purge_view_events(days=30, chunk_size=2) == 5
+    assert list(ListingViewEvent.objects.values_list("created_at", flat=True)) == [now]
+
+
+@pytest.mark.django_db
+def test_view_flush_fills_time_buckets_and_trending_order():
+    import datetime
+
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+
+    from apps.listings.models import ListingDailyStat, ListingHourlyStat
+    from apps.listings.view_stats import upsert_view_totals
+
+    user = User.objects.create_user(email="tr@t.com", username="tr", password="x", role="landlord")
+    old, recent, unseen = (
+        Listing.objects.create(owner=user, title=t, description="d", price=Decimal("50"), rooms=1,
+                               housing_type="apartment")
+        for t in ("old", "recent", "unseen")
+    )
+    now = timezone.now()
+    upsert_view_totals({old.pk: 10}, at=now - datetime.timedelta(days=3))
+    upsert_view_totals({recent.pk: 2}, at=now)
+    upsert_view_totals({recent.pk: 1}, at=now)
+
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    assert ListingHourlyStat.objects.get(listing=recent, hour=hour).views == 3
+    assert ListingDailyStat.objects.get(listing=recent, date=timezone.localdate(now)).views == 3
+    assert ListingDailyStat.objects.get(listing=old).views == 10
+
+    # Ten views halved three times are fewer than three views now.
+    response = APIClient().get("/api/listings/", {"sort": "trending"})
+    titles = [row["title"] for row in response.json()["results"]]
+    assert titles[:2] == ["recent", "old"] and "unseen" in titles
+    response = APIClient().get("/api/listings/", {"sort": "trending", "pagination": "cursor"})
+    assert [row["title"] for row in response.json()["results"]] == ["recent", "old"]
+
+
+@pytest.mark.django_db
+def test_redis_failures_are_scrapeable(monkeypatch, settings):
+    from django.test import Client
+
+    from apps.common.redis_client import get_redis_client
+    from apps.listings.view_events import record_view_event
+
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    settings.METRICS_TOKEN = "secret"
+    assert get_redis_client() is get_redis_client()
+
+    user = User.objects.create_user(email="rm@t.com", username="rm", password="x", role="landlord")
+    listing = Listing.objects.create(owner=user, title="t", description="d", price=Decimal("50"), rooms=1,
+                                     housing_type="apartment")
+    record_view_event(listing.pk, user.pk)
+
+    client = Client()
+    assert client.get("/metrics/").status_code == 403
+    assert client.get("/metrics/", HTTP_AUTHORIZATION="Bearer wrong").status_code == 403
+    body = client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret").content.decode()
+    assert 'redis_command_errors_total{command="XADD",error="ConnectionError"}' in body
+    assert 'redis_command_duration_seconds_bucket{command="XADD",le="+Inf"}' in body
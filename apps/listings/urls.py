@@ -3,15 +3,20 @@ from rest_framework.routers import DefaultRouter
 
 from .views import ListingViewSet
 
-from .views import listings_search
+from .views import listings_map, listings_search
 
-from .views import popular_searches
+from .views import listings_autocomplete, listings_facets, popular_searches, search_cache_stats
 
 router = DefaultRouter()
 router.register(r"listings", ListingViewSet, basename="listing")
 
 urlpatterns = [
+    # Before the router, whose detail route would take these names as a pk.
+    path("listings/autocomplete/", listings_autocomplete, name="listings_autocomplete"),
+    path("listings/facets/", listings_facets, name="listings_facets"),
     path("", include(router.urls)),
     path("listings-search/", listings_search, name="listings_search"),
+    path("listings-map/", listings_map, name="listings_map"),
     path("listings/search/popular/", popular_searches),
+    path("listings/search/cache-stats/", search_cache_stats),
 ]
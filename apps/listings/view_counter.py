@@ -0,0 +1,132 @@
+"""Counting listing detail views from the request, without a Celery task.
+
+Each process adds views to an in-memory accumulator and pushes it to the
+Redis counters (``listing:<id>:views``, drained by ``view_stats``) with one
+pipeline of INCRBY every ``FLUSH_EVERY_VIEWS`` views or ``FLUSH_INTERVAL``
+seconds, whichever comes first. While Redis is unavailable the counts stay
+in the accumulator and no flush is tried for ``RETRY_AFTER_FAILURE``
+seconds, so a request waits on a dead Redis at most once per that period.
+Beyond ``MAX_PENDING_LISTINGS`` distinct listings new views are dropped
+(and logged) rather than letting memory grow without bound.
+
+Visitors are collected the same way and PFADDed to a HyperLogLog per
+listing and day in the same pipeline, for unique-visitor counts.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+import redis
+from django.utils import timezone
+
+from apps.common.redis_client import get_pipeline
+
+from .view_stats import UNIQUE_VISITORS_TTL, unique_visitors_key, views_key
+
+logger = logging.getLogger(__name__)
+
+FLUSH_EVERY_VIEWS = 50
+FLUSH_INTERVAL = 5.0
+MAX_PENDING_LISTINGS = 10_000
+# After a failed flush, views are only recorded until this many seconds pass.
+RETRY_AFTER_FAILURE = 30.0
+
+
+class ViewCounter:
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._visitors = {}
+        self._pending_views = 0
+        self._last_flush = time.monotonic()
+        self._retry_after = 0.0
+        self._redis_down = False
+
+    def record(self, listing_id, visitor=None) -> None:
+        with self._lock:
+            if listing_id in self._pending:
+                self._pending[listing_id] += 1
+            elif len(self._pending) < MAX_PENDING_LISTINGS:
+                self._pending[listing_id] = 1
+            else:
+                logger.warning("view counter: accumulator full, dropping a view of listing %s", listing_id)
+                return
+            self._pending_views += 1
+            if visitor:
+                self._visitors.setdefault(unique_visitors_key(listing_id, timezone.localdate()), set()).add(visitor)
+            now = time.monotonic()
+            due = now >= self._retry_after and (
+                self._pending_views >= FLUSH_EVERY_VIEWS
+                or now - self._last_flush >= FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def pending(self) -> dict:
+        with self._lock:
+            return dict(self._pending)
+
+    def pending_visitors(self) -> dict:
+        with self._lock:
+            return {key: set(visitors) for key, visitors in self._visitors.items()}
+
+    def flush(self) -> int:
+        """Push accumulated views to Redis; returns how many were written."""
+        with self._lock:
+            batch, self._pending, self._pending_views = self._pending, {}, 0
+            visitors, self._visitors = self._visitors, {}
+            self._last_flush = time.monotonic()
+        if not batch:
+            return 0
+        try:
+            pipe = get_pipeline()
+            for listing_id, count in batch.items():
+                pipe.incrby(views_key(listing_id), count)
+            for key, members in visitors.items():
+                pipe.pfadd(key, *members)
+                pipe.expire(key, UNIQUE_VISITORS_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            self._merge_back(batch, visitors)
+            self._retry_after = time.monotonic() + RETRY_AFTER_FAILURE
+            if not self._redis_down:
+                logger.warning("view counter: redis unavailable, keeping %d listings' views in memory",
+                               len(batch), exc_info=True)
+            self._redis_down = True
+            return 0
+        if self._redis_down:
+            logger.info("view counter: redis is back, flushed pending views")
+        self._redis_down = False
+        return sum(batch.values())
+
+    def _merge_back(self, batch, visitors) -> None:
+        with self._lock:
+            for listing_id, count in batch.items():
+                if listing_id in self._pending or len(self._pending) < MAX_PENDING_LISTINGS:
+                    # Not counted in _pending_views: they must not trigger the next flush.
+                    self._pending[listing_id] = self._pending.get(listing_id, 0) + count
+            for key, members in visitors.items():
+                if key in self._visitors or len(self._visitors) < MAX_PENDING_LISTINGS:
+                    self._visitors.setdefault(key, set()).update(members)
+
+
+counter = ViewCounter()
+atexit.register(counter.flush)
+# A forked worker must not flush the views its parent accumulated.
+os.register_at_fork(after_in_child=counter._reset)
+
+
+def record_listing_view(listing_id, owner_id=None, user=None, visitor=None) -> None:
+    """Count one detail view of ``listing_id`` by ``visitor`` (see ``search_log.visitor_id``).
+
+    Owners viewing their own listing are skipped.
+    """
+    if user is not None and user.is_authenticated and owner_id is not None and user.pk == owner_id:
+        return
+    counter.record(listing_id, visitor)
@@ -0,0 +1,143 @@
+"""Batched writing of ``ListingViewEvent`` rows through a Redis Stream.
+
+``record_view_event`` appends one entry to ``STREAM_KEY`` with XADD instead
+of inserting a row. The ``ingest_view_events`` beat task reads the stream
+as a member of the ``GROUP`` consumer group (XREADGROUP), writes each batch
+with one ``bulk_create`` and only then acknowledges and deletes its entries
+(XACK + XDEL), so a database error or a killed worker leaves them pending.
+Entries pending longer than ``CLAIM_IDLE_MS`` are taken over with
+XAUTOCLAIM by the next run, whichever worker left them. When Redis is
+unavailable the event is written straight to the database instead.
+
+``purge_view_events`` deletes events older than
+``LISTING_VIEW_EVENTS_RETENTION_DAYS`` in chunks of primary keys, so no
+single DELETE holds locks for long.
+"""
+
+import datetime
+import logging
+import os
+import socket
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from apps.common.redis_client import get_redis_client
+
+from .models import Listing, ListingViewEvent
+from .view_stats import DELETE_CHUNK_SIZE, delete_in_chunks
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "listing:view-events"
+GROUP = "view-event-writers"
+# Safety cap while the writers are down; trimming is approximate (~).
+STREAM_MAX_LENGTH = 1_000_000
+BATCH_SIZE = 1000
+CLAIM_IDLE_MS = 5 * 60 * 1000
+
+
+def consumer_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def record_view_event(listing_id, user_id) -> None:
+    now = timezone.now()
+    try:
+        get_redis_client().xadd(
+            STREAM_KEY,
+            {"l": listing_id, "u": user_id, "t": now.timestamp()},
+            maxlen=STREAM_MAX_LENGTH,
+            approximate=True,
+        )
+    except redis.RedisError:
+        logger.warning("view events: redis unavailable, writing the event directly", exc_info=True)
+        ListingViewEvent.objects.create(listing_id=listing_id, user_id=user_id, created_at=now)
+
+
+def ensure_group(r) -> None:
+    try:
+        r.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def build_events(entries) -> list:
+    """``ListingViewEvent`` objects for stream ``entries`` of existing listings and users."""
+    parsed = []
+    for entry_id, fields in entries:
+        try:
+            parsed.append((
+                int(fields["l"]),
+                int(fields["u"]),
+                datetime.datetime.fromtimestamp(float(fields["t"]), tz=datetime.timezone.utc),
+            ))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            logger.warning("view events: dropping malformed entry %s %r", entry_id, fields)
+    if not parsed:
+        return []
+    listings = set(Listing.all_objects.filter(pk__in={p[0] for p in parsed}).values_list("pk", flat=True))
+    users = set(get_user_model().objects.filter(pk__in={p[1] for p in parsed}).values_list("pk", flat=True))
+    return [
+        ListingViewEvent(listing_id=listing_id, user_id=user_id, created_at=created_at)
+        for listing_id, user_id, created_at in parsed
+        if listing_id in listings and user_id in users
+    ]
+
+
+def _write_batch(r, entries) -> int:
+    events = build_events(entries)
+    with transaction.atomic():
+        ListingViewEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+    ids = [entry_id for entry_id, _ in entries]
+    pipe = r.pipeline(transaction=False)
+    pipe.xack(STREAM_KEY, GROUP, *ids)
+    pipe.xdel(STREAM_KEY, *ids)
+    pipe.execute()
+    return len(events)
+
+
+def ingest_view_events(batch_size=BATCH_SIZE, max_batches=100, consumer=None) -> int:
+    """Write pending stream entries to the database; returns rows written."""
+    r = get_redis_client()
+    consumer = consumer or consumer_name()
+    ensure_group(r)
+    written = 0
+
+    # Entries a crashed or failed run read but never acknowledged.
+    start = "0-0"
+    for _ in range(max_batches):
+        claimed = r.xautoclaim(
+            STREAM_KEY, GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id=start, count=batch_size
+        )
+        start, entries = claimed[0], claimed[1]
+        live = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if live:
+            written += _write_batch(r, live)
+        # Redis 6.2 still hands out entries deleted after they were read.
+        gone = [entry_id for entry_id, fields in entries if not fields]
+        if gone:
+            r.xack(STREAM_KEY, GROUP, *gone)
+        if start == "0-0":
+            break
+
+    for _ in range(max_batches):
+        response = r.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=batch_size)
+        if not response:
+            break
+        entries = response[0][1]
+        written += _write_batch(r, entries)
+        if len(entries) < batch_size:
+            break
+    return written
+
+
+def purge_view_events(days=None, chunk_size=DELETE_CHUNK_SIZE) -> int:
+    """Delete events older than ``days``; returns rows deleted."""
+    days = settings.LISTING_VIEW_EVENTS_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    return delete_in_chunks(ListingViewEvent.objects.filter(created_at__lt=cutoff), chunk_size)
@@ -0,0 +1,258 @@
+"""Moving listing view counters from Redis into the view statistics.
+
+Views are counted in Redis under ``listing:<id>:views``. The beat task walks
+those keys with SCAN and, per SCAN batch, drains them with one pipeline of
+GETDEL and applies all deltas with multi-row upserts
+(``INSERT ... ON DUPLICATE KEY UPDATE`` on MySQL, ``ON CONFLICT`` elsewhere)
+that add to the lifetime totals, to the buckets of the current hour
+(``ListingHourlyStat``) and day (``ListingDailyStat``), and update the
+decayed ``trending_score``. If the upsert fails the drained deltas are put
+back with INCRBY, so they are retried on the next run. The task runs every
+minute, so views land in the hour they happened give or take that minute.
+
+Unique visitors go to one HyperLogLog per listing and day,
+``listing:<id>:uv:<YYYYMMDD>`` (about 12 KB at most however many visitors).
+``fold_unique_visitors`` runs nightly for the finished days: it PFCOUNTs the
+keys in pipelines and upserts ``ListingDailyStat.unique_visitors``. The keys
+are not deleted but left to expire after ``UNIQUE_VISITORS_TTL``: a worker
+without views around midnight PFADDs yesterday's visitors only on its next
+flush, and refolding a day picks those up.
+"""
+
+import datetime
+import logging
+import math
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.common.redis_client import get_redis_client
+
+from .models import Listing, ListingDailyStat, ListingHourlyStat, ListingViewStat
+
+logger = logging.getLogger(__name__)
+
+VIEWS_KEY_PATTERN = "listing:*:views"
+VIEWS_KEY_RE = re.compile(r"^listing:(\d+):views$")
+UNIQUE_VISITORS_RE = re.compile(r"^listing:(\d+):uv:\d{8}$")
+# Long enough for the nightly fold to be repeated for a day or two.
+UNIQUE_VISITORS_TTL = 3 * 24 * 3600
+# The nightly fold covers this many finished days, so late visitors are counted.
+FOLD_DAYS = 2
+SCAN_BATCH_SIZE = 1000
+# Rows per INSERT, further limited by the backend's parameter limit.
+MAX_UPSERT_ROWS = 1000
+DELETE_CHUNK_SIZE = 5000
+HOURLY_STATS_RETENTION_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def views_key(listing_id) -> str:
+    return f"listing:{listing_id}:views"
+
+
+def unique_visitors_key(listing_id, day) -> str:
+    return f"listing:{listing_id}:uv:{day:%Y%m%d}"
+
+
+def drain_counters(r, keys) -> dict:
+    """GETDEL ``keys`` in one pipeline and return ``{listing_id: delta}``."""
+    keys = [k for k in keys if VIEWS_KEY_RE.match(k)]
+    if not keys:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.getdel(key)
+    deltas = {}
+    for key, value in zip(keys, pipe.execute()):
+        try:
+            delta = int(value)
+        except (TypeError, ValueError):
+            continue
+        if delta > 0:
+            listing_id = int(VIEWS_KEY_RE.match(key).group(1))
+            deltas[listing_id] = deltas.get(listing_id, 0) + delta
+    return deltas
+
+
+def restore_counters(r, deltas) -> None:
+    pipe = r.pipeline(transaction=False)
+    for listing_id, delta in deltas.items():
+        pipe.incrby(views_key(listing_id), delta)
+    pipe.execute()
+
+
+def decayed_score(previous, delta, at) -> float:
+    """Add ``delta`` views seen at ``at`` to a trending score.
+
+    The score is ``log2(sum(views * 2 ** (hours_since_epoch / half_life)))``
+    over all views so far. Weighting by the time of the view instead of
+    decaying old totals means scores never need rewriting as time passes,
+    and ordering by them is ordering by views halved every
+    ``TRENDING_HALF_LIFE_HOURS``. The log keeps the value finite.
+    """
+    weight = (at - TRENDING_EPOCH).total_seconds() / 3600 / TRENDING_HALF_LIFE_HOURS + math.log2(delta)
+    if previous is None:
+        return weight
+    high, low = max(previous, weight), min(previous, weight)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def _upsert_sql(model, columns, unique, added=(), replaced=(), rows=1) -> str:
+    """Multi-row INSERT of ``columns`` that adds ``added`` and overwrites ``replaced`` on conflict."""
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    sql = (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES {', '.join([placeholders] * rows)} "
+    )
+    if connection.vendor == "mysql":
+        sets = [f"{qn(c)} = {qn(c)} + VALUES({qn(c)})" for c in added]
+        sets += [f"{qn(c)} = VALUES({qn(c)})" for c in replaced]
+        return sql + "ON DUPLICATE KEY UPDATE " + ", ".join(sets)
+    sets = [f"{qn(c)} = {table}.{qn(c)} + excluded.{qn(c)}" for c in added]
+    sets += [f"{qn(c)} = excluded.{qn(c)}" for c in replaced]
+    return sql + f"ON CONFLICT ({', '.join(qn(c) for c in unique)}) DO UPDATE SET " + ", ".join(sets)
+
+
+def _upsert(cursor, model, columns, unique, rows, added=(), replaced=()) -> None:
+    max_params = connection.features.max_query_params or len(columns) * MAX_UPSERT_ROWS
+    max_rows = min(MAX_UPSERT_ROWS, max_params // len(columns))
+    for start in range(0, len(rows), max_rows):
+        chunk = rows[start:start + max_rows]
+        sql = _upsert_sql(model, columns, unique, added, replaced, rows=len(chunk))
+        cursor.execute(sql, [value for row in chunk for value in row])
+
+
+def upsert_view_totals(deltas, at=None) -> int:
+    """Add ``{listing_id: delta}`` seen at ``at`` (now) to the view statistics.
+
+    One transaction adds the deltas to ``views_total``, to the hour and day
+    buckets of ``at`` and to ``trending_score``, whose current values are
+    read under a row lock. Returns listings updated; deltas of listings that
+    no longer exist are dropped.
+    """
+    at = at or timezone.now()
+    existing = sorted(Listing.all_objects.filter(pk__in=list(deltas)).values_list("pk", flat=True))
+    if not existing:
+        return 0
+    ops = connection.ops
+    now = ops.adapt_datetimefield_value(at)
+    hour = ops.adapt_datetimefield_value(at.replace(minute=0, second=0, microsecond=0))
+    day = ops.adapt_datefield_value(timezone.localdate(at))
+    with transaction.atomic(), connection.cursor() as cursor:
+        scores = dict(
+            ListingViewStat.objects.select_for_update()
+            .filter(pk__in=existing)
+            .values_list("pk", "trending_score")
+        )
+        _upsert(
+            cursor, ListingViewStat, ("listing_id", "views_total", "trending_score", "updated_at"), ("listing_id",),
+            [(pk, deltas[pk], decayed_score(scores.get(pk), deltas[pk], at), now) for pk in existing],
+            added=("views_total",), replaced=("trending_score", "updated_at"),
+        )
+        _upsert(
+            cursor, ListingHourlyStat, ("listing_id", "hour", "views"), ("listing_id", "hour"),
+            [(pk, hour, deltas[pk]) for pk in existing],
+            added=("views",),
+        )
+        _upsert(
+            cursor, ListingDailyStat, ("listing_id", "date", "views", "unique_visitors"), ("listing_id", "date"),
+            [(pk, day, deltas[pk], 0) for pk in existing],
+            added=("views",),
+        )
+    return len(existing)
+
+
+def delete_in_chunks(qs, chunk_size=DELETE_CHUNK_SIZE) -> int:
+    """Delete ``qs`` a chunk of primary keys at a time; returns rows deleted."""
+    qs = qs.order_by("pk")
+    deleted = 0
+    while True:
+        ids = list(qs.values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += qs.model._default_manager.filter(pk__in=ids).delete()[0]
+
+
+def prune_hourly_stats(days=HOURLY_STATS_RETENTION_DAYS) -> int:
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    return delete_in_chunks(ListingHourlyStat.objects.filter(hour__lt=cutoff))
+
+
+def flush_view_counters(batch_size=SCAN_BATCH_SIZE) -> dict:
+    r = get_redis_client()
+    cursor = 0
+    keys_found = listings_updated = total_increment = 0
+    while True:
+        cursor, keys = r.scan(cursor=cursor, match=VIEWS_KEY_PATTERN, count=batch_size)
+        keys_found += len(keys)
+        deltas = drain_counters(r, keys)
+        if deltas:
+            try:
+                listings_updated += upsert_view_totals(deltas)
+            except Exception:
+                logger.exception("view stats: upsert failed, returning %d counters to redis", len(deltas))
+                restore_counters(r, deltas)
+                raise
+            total_increment += sum(deltas.values())
+        if cursor == 0:
+            break
+    return {
+        "status": "ok",
+        "keys_found": keys_found,
+        "listings_updated": listings_updated,
+        "total_increment": total_increment,
+    }
+
+
+def count_unique_visitors(r, keys) -> dict:
+    """PFCOUNT ``keys`` in one pipeline and return ``{listing_id: visitors}``."""
+    keys = [k for k in keys if UNIQUE_VISITORS_RE.match(k)]
+    if not keys:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.pfcount(key)
+    return {int(UNIQUE_VISITORS_RE.match(key).group(1)): count for key, count in zip(keys, pipe.execute())}
+
+
+def upsert_unique_visitors(day, counts) -> int:
+    """Store ``{listing_id: visitors}`` for ``day``; returns rows written."""
+    existing = set(Listing.all_objects.filter(pk__in=list(counts)).values_list("pk", flat=True))
+    rows = [
+        ListingDailyStat(listing_id=listing_id, date=day, unique_visitors=count)
+        for listing_id, count in counts.items()
+        if listing_id in existing
+    ]
+    ListingDailyStat.objects.bulk_create(
+        rows,
+        batch_size=MAX_UPSERT_ROWS,
+        update_conflicts=True,
+        unique_fields=["listing", "date"],
+        update_fields=["unique_visitors"],
+    )
+    return len(rows)
+
+
+def fold_unique_visitors(day, batch_size=SCAN_BATCH_SIZE) -> dict:
+    """Fold the HyperLogLogs of ``day`` into ``ListingDailyStat``.
+
+    Counting is idempotent, so a day can be folded again as visitors are
+    added late, and a failed run is simply repeated.
+    """
+    r = get_redis_client()
+    cursor = 0
+    keys_found = listings_updated = 0
+    while True:
+        cursor, keys = r.scan(cursor=cursor, match=f"listing:*:uv:{day:%Y%m%d}", count=batch_size)
+        keys_found += len(keys)
+        counts = count_unique_visitors(r, keys)
+        if counts:
+            listings_updated += upsert_unique_visitors(day, counts)
+        if cursor == 0:
+            break
+    return {"status": "ok", "date": day.isoformat(), "keys_found": keys_found, "listings_updated": listings_updated}
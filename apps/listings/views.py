@@ -1,24 +1,42 @@
 
-from decimal import Decimal, InvalidOperation
-
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Q, OuterRef, Subquery, IntegerField, Value, Avg, Count
-from django.db.models.functions import Coalesce
 from django.http import JsonResponse
-from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_GET
 
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 
-from .models import Listing, ListingViewStat
-from .serializers import ListingSerializer
+from apps.common.fastjson import FastJsonResponse
+
+from .autocomplete import TOP_K, suggest
+from .facets import cached_facets
+from .fx import get_rates
+from .geo import bbox_around, map_search, parse_bbox
+from .models import Listing
+from .serializers import ListingListSerializer, ListingSerializer
 from .permissions import IsLandlord, IsOwnerOrReadOnly
-from .tasks import track_listing_view, save_listing_view_event
+from .pagination import (
+    InvalidCursor,
+    KEYSET_SORTS,
+    ListingKeysetPagination,
+    keyset_page,
+    resolve_sort,
+    wants_keyset,
+)
+from .search_cache import cache_stats
+from .search_log import record_search_query, visitor_id
+from .search_trends import DEFAULT_WINDOW, top_queries
+from .search import ListingSearchSpec, views_total_annotation
+from .search_rows import CachedSearchRows, build_search_rows, search_row_values
+from .view_counter import record_listing_view
+from .view_events import record_view_event
+
+SEARCH_KEYSET_SORTS = set(KEYSET_SORTS) - {"views_desc", "trending"}
+MAX_MAP_RADIUS_KM = 200.0
 
 
 def _to_int(v):
@@ -28,122 +46,45 @@ def _to_int(v):
         return None
 
 
-def _to_decimal(v):
+def _to_float(v):
     try:
-        return Decimal(v)
-    except (TypeError, ValueError, InvalidOperation):
+        return float(v)
+    except (TypeError, ValueError):
         return None
 
 
 class ListingViewSet(viewsets.ModelViewSet):
     serializer_class = ListingSerializer
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and wants_keyset(self.request.query_params):
+            self._paginator = ListingKeysetPagination()
+        return super().paginator
+
     def get_queryset(self):
-        qs = (
-            Listing.objects
-            .filter(is_active=True)
-            .annotate(
-                avg_rating=Coalesce(Avg("reviews__rating"), 0.0),
-                reviews_count=Count("reviews", distinct=True),
-            )
-        )
+        qs = Listing.objects.filter(is_active=True).annotate(_views_total=views_total_annotation())
 
-        subq = (
-            ListingViewStat.objects
-            .filter(listing_id=OuterRef("pk"))
-            .values("views_total")[:1]
-        )
-        qs = qs.annotate(
-            _views_total=Coalesce(Subquery(subq, output_field=IntegerField()), Value(0))
-        )
+        spec = ListingSearchSpec.from_params(self.request.query_params)
+        if spec.errors:
+            raise ValidationError(spec.errors)
+        return spec.build(qs)
 
-        params = self.request.query_params
-
-        date_from = params.get("date_from")
-        date_to = params.get("date_to")
-        if date_from and date_to:
-            df = parse_date(date_from)
-            dt = parse_date(date_to)
-
-            if not df or not dt:
-                raise ValidationError({"date": "date_from и date_to должны быть в формате YYYY-MM-DD"})
-            if df >= dt:
-                raise ValidationError({"date": "date_from должен быть меньше date_to"})
-
-
-            qs = qs.exclude(
-                bookings__date_from__lt=dt,
-                bookings__date_to__gt=df,
-                bookings__status__in=["pending", "approved"],
-            ).distinct()
-
-        q = params.get("q")
-        if q:
-            qs = qs.filter(
-                Q(title__icontains=q) |
-                Q(description__icontains=q) |
-                Q(city__icontains=q) |
-                Q(country__icontains=q) |
-                Q(street__icontains=q) |
-                Q(postal_code__icontains=q)
-            )
+    def list_rows(self, qs, extra=()):
+        """``(rows, fields)``: ``qs`` as ``values()`` rows trimmed to ``?fields=``."""
+        fields = ListingListSerializer.parse_fields(self.request.query_params.get("fields"))
+        return ListingListSerializer.select(qs, fields, extra), fields
 
-        city = params.get("city")
-        if city:
-            qs = qs.filter(city__icontains=city)
-
-        country = params.get("country")
-        if country:
-            qs = qs.filter(country__icontains=country)
-
-        district = params.get("district")
-        if district:
-            qs = qs.filter(Q(street__icontains=district) | Q(postal_code__icontains=district))
-
-        housing_type = params.get("housing_type")
-        if housing_type:
-            qs = qs.filter(housing_type=housing_type)
-
-        rooms_min = _to_int(params.get("rooms_min"))
-        if rooms_min is not None:
-            qs = qs.filter(rooms__gte=rooms_min)
-
-        rooms_max = _to_int(params.get("rooms_max"))
-        if rooms_max is not None:
-            qs = qs.filter(rooms__lte=rooms_max)
-
-        currency = params.get("currency")
-        if currency:
-            qs = qs.filter(currency=currency)
-
-        price_min = _to_decimal(params.get("price_min"))
-        if price_min is not None:
-            qs = qs.filter(price__gte=price_min)
-
-        price_max = _to_decimal(params.get("price_max"))
-        if price_max is not None:
-            qs = qs.filter(price__lte=price_max)
-
-        sort = params.get("sort", "date_new")
-
-        if sort == "rating_desc":
-            qs = qs.order_by("-avg_rating", "-reviews_count", "-created_at")
-        elif sort == "rating_asc":
-            qs = qs.order_by("avg_rating", "reviews_count", "-created_at")
-        elif sort == "views_desc":
-            qs = qs.order_by("-_views_total", "-created_at")
-        elif sort == "reviews_desc":
-            qs = qs.order_by("-reviews_count", "-avg_rating", "-created_at")
-        elif sort == "price_asc":
-            qs = qs.order_by("price", "-created_at")
-        elif sort == "price_desc":
-            qs = qs.order_by("-price", "-created_at")
-        elif sort == "date_old":
-            qs = qs.order_by("created_at")
-        else:
-            qs = qs.order_by("-created_at")
+    def list(self, request, *args, **kwargs):
+        extra = ()
+        if isinstance(self.paginator, ListingKeysetPagination):
+            extra = (self.paginator.get_sort_field(request, self),)
+        rows, fields = self.list_rows(self.filter_queryset(self.get_queryset()), extra)
 
-        return qs
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(ListingListSerializer(page, many=True, fields=fields).data)
+        return Response(ListingListSerializer(rows, many=True, fields=fields).data)
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -164,6 +105,7 @@ class ListingViewSet(viewsets.ModelViewSet):
             original.id = None
             original.title = f"{original.title} (copy)"
             original.owner = request.user
+            original.reset_review_stats()
             original.save()
 
         return Response(self.get_serializer(original).data, status=status.HTTP_201_CREATED)
@@ -188,11 +130,10 @@ class ListingViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         obj = self.get_object()
 
-        user_id = request.user.id if request.user.is_authenticated else None
-        track_listing_view.delay(obj.id, user_id, obj.owner_id)
+        record_listing_view(obj.id, obj.owner_id, request.user, visitor_id(request))
 
         if request.user.is_authenticated:
-            save_listing_view_event.delay(obj.id, request.user.id)
+            record_view_event(obj.id, request.user.id)
 
         serializer = self.get_serializer(obj)
         return Response(serializer.data)
@@ -202,8 +143,9 @@ class ListingViewSet(viewsets.ModelViewSet):
         limit = _to_int(request.query_params.get("limit")) or 10
         limit = max(1, min(limit, 100))
 
-        qs = self.get_queryset().order_by("-_views_total", "-created_at")[:limit]
-        return Response(self.get_serializer(qs, many=True).data)
+        qs = self.get_queryset().order_by("-_views_total", "-created_at")
+        rows, fields = self.list_rows(qs)
+        return Response(ListingListSerializer(rows[:limit], many=True, fields=fields).data)
 
     @action(
         detail=False,
@@ -236,124 +178,104 @@ class ListingViewSet(viewsets.ModelViewSet):
 
 @require_GET
 def listings_search(request):
-    qs = Listing.objects.filter(is_active=True).annotate(
-        avg_rating=Coalesce(Avg("reviews__rating"), 0.0),
-        reviews_count=Count("reviews", distinct=True),
-    )
+    spec = ListingSearchSpec.from_params(request.GET)
+    if spec.q:
+        record_search_query(spec.q, request.user, visitor_id(request))
+    qs = spec.build()
 
+    rates = get_rates()
     warnings = []
-
-    q = request.GET.get("q")
-    if q:
-        q_clean = q.strip()
-        if q_clean:
-            from .models import SearchQuery
-            SearchQuery.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                query=q_clean[:255],
-            )
-
-        qs = qs.filter(
-            Q(title__icontains=q) |
-            Q(description__icontains=q) |
-            Q(city__icontains=q) |
-            Q(country__icontains=q) |
-            Q(street__icontains=q) |
-            Q(postal_code__icontains=q)
-        )
-
-    country = request.GET.get("country")
-    if country:
-        qs = qs.filter(country__icontains=country)
-
-    district = request.GET.get("district")
-    if district:
-        qs = qs.filter(Q(street__icontains=district) | Q(postal_code__icontains=district))
-
-    housing_type = request.GET.get("housing_type")
-    if housing_type:
-        qs = qs.filter(housing_type=housing_type)
-
-    rooms_min = _to_int(request.GET.get("rooms_min"))
-    if rooms_min is not None:
-        qs = qs.filter(rooms__gte=rooms_min)
-
-    rooms_max = _to_int(request.GET.get("rooms_max"))
-    if rooms_max is not None:
-        qs = qs.filter(rooms__lte=rooms_max)
-
-    currency = request.GET.get("currency")
-    if currency:
-        qs = qs.filter(currency=currency)
-
-    price_min = _to_decimal(request.GET.get("price_min"))
-    price_max = _to_decimal(request.GET.get("price_max"))
-
-    if (price_min is not None or price_max is not None) and not currency:
+    if (spec.price_min is not None or spec.price_max is not None) and not spec.currency \
+            and spec.display_currency not in rates:
         warnings.append(
-            "Вы используете price_min/price_max без currency. "
-            "Сравнение будет выполнено по числам во всех валютах сразу."
+            f"Нет курса для {spec.display_currency}: price_min/price_max "
+            "сравниваются по числам во всех валютах сразу."
         )
 
-    if price_min is not None:
-        qs = qs.filter(price__gte=price_min)
-    if price_max is not None:
-        qs = qs.filter(price__lte=price_max)
-
-    sort = request.GET.get("sort", "date_new")
-    if sort == "rating_desc":
-        qs = qs.order_by("-avg_rating", "-reviews_count", "-created_at")
-    elif sort == "rating_asc":
-        qs = qs.order_by("avg_rating", "reviews_count", "-created_at")
-    elif sort == "reviews_desc":
-        qs = qs.order_by("-reviews_count", "-avg_rating", "-created_at")
-    elif sort == "price_asc":
-        qs = qs.order_by("price", "-created_at")
-    elif sort == "price_desc":
-        qs = qs.order_by("-price", "-created_at")
-    elif sort == "date_old":
-        qs = qs.order_by("created_at")
-    else:
-        qs = qs.order_by("-created_at")
-
     page = _to_int(request.GET.get("page")) or 1
     page_size = _to_int(request.GET.get("page_size")) or 10
     page_size = max(1, min(page_size, 100))
 
-    paginator = Paginator(qs, page_size)
-    page_obj = paginator.get_page(page)
-
-    results = []
-    for x in page_obj.object_list:
-        results.append({
-            "id": x.id,
-            "title": x.title,
-            "description": x.description,
-            "price": str(x.price),
-            "currency": x.currency,
-            "rooms": x.rooms,
-            "housing_type": x.housing_type,
-            "parking_type": x.parking_type,
-            "country": x.country,
-            "city": x.city,
-            "postal_code": x.postal_code,
-            "street": x.street,
-            "house_number": x.house_number,
-            "floor": x.floor,
-            "apartment_number": x.apartment_number,
-            "full_address": x.full_address(),
-            "created_at": x.created_at.isoformat() if x.created_at else None,
-            "avg_rating": float(getattr(x, "avg_rating", 0.0)),
-            "reviews_count": int(getattr(x, "reviews_count", 0)),
+    if wants_keyset(request.GET):
+        keyset_sort = resolve_sort(spec.sort, SEARCH_KEYSET_SORTS)
+        try:
+            items, next_cursor = keyset_page(
+                search_row_values(qs), keyset_sort, request.GET.get("cursor") or None, page_size
+            )
+        except InvalidCursor:
+            return JsonResponse({"cursor": "Некорректный или устаревший курсор."}, status=400)
+        return FastJsonResponse({
+            "next_cursor": next_cursor,
+            "page_size": page_size,
+            "display_currency": spec.display_currency,
+            "warnings": warnings,
+            "results": build_search_rows(items, spec.display_currency, rates),
         })
 
-    return JsonResponse({
+    results_seq = CachedSearchRows(qs, Listing.objects.all(), "api_search", request.GET)
+    paginator = Paginator(results_seq, page_size)
+    page_obj = paginator.get_page(page)
+
+    return FastJsonResponse({
         "count": paginator.count,
         "pages": paginator.num_pages,
         "page": page_obj.number,
         "page_size": page_size,
+        "display_currency": spec.display_currency,
         "warnings": warnings,
-        "results": results,
+        "results": build_search_rows(page_obj.object_list, spec.display_currency, rates),
+    })
+
+
+@require_GET
+def listings_map(request):
+    """Listings inside a map viewport (``bbox``) or around a point, nearest first."""
+    try:
+        if request.GET.get("bbox"):
+            bbox = parse_bbox(request.GET["bbox"])
+            center = None
+            radius_km = _to_float(request.GET.get("radius_km"))
+        else:
+            center = (float(request.GET["lat"]), float(request.GET["lng"]))
+            if not (-90 <= center[0] <= 90 and -180 <= center[1] <= 180):
+                raise ValueError("center out of range")
+            radius_km = _to_float(request.GET.get("radius_km")) or 5.0
+            radius_km = max(0.1, min(radius_km, MAX_MAP_RADIUS_KM))
+            bbox = bbox_around(center[0], center[1], radius_km)
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {"bbox": "Укажите bbox=south,west,north,east или lat, lng и radius_km."},
+            status=400,
+        )
+
+    limit = _to_int(request.GET.get("limit")) or 200
+    limit = max(1, min(limit, 500))
+
+    spec = ListingSearchSpec.from_params(request.GET)
+    if spec.errors:
+        return JsonResponse(spec.errors, status=400)
+    qs = spec.build()
+    hits = map_search(qs, bbox, center=center, radius_km=radius_km, limit=limit)
+    listings = Listing.objects.in_bulk([pk for pk, _ in hits])
+
+    return JsonResponse({
+        "count": len(hits),
+        "results": [
+            {
+                "id": pk,
+                "title": listings[pk].title,
+                "city": listings[pk].city,
+                "price": str(listings[pk].price),
+                "currency": listings[pk].currency,
+                "latitude": float(listings[pk].latitude),
+                "longitude": float(listings[pk].longitude),
+                "distance_km": round(distance, 3),
+                "avg_rating": float(listings[pk].avg_rating),
+                "reviews_count": listings[pk].reviews_count,
+            }
+            for pk, distance in hits
+            if pk in listings
+        ],
     }, json_dumps_params={"ensure_ascii": False})
 
 
@@ -363,13 +285,29 @@ def popular_searches(request):
     limit = _to_int(request.GET.get("limit")) or 20
     limit = max(1, min(limit, 100))
 
-    from .models import SearchQuery
+    return Response(top_queries(request.GET.get("window", DEFAULT_WINDOW), limit))
 
-    data = (
-        SearchQuery.objects
-        .values("query")
-        .annotate(cnt=Count("id"))
-        .order_by("-cnt", "query")[:limit]
-    )
 
-    return Response(list(data))
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def listings_autocomplete(request):
+    prefix = (request.GET.get("prefix") or "")[:100]
+    limit = _to_int(request.GET.get("limit")) or 10
+    limit = max(1, min(limit, TOP_K))
+
+    return Response({"prefix": prefix, "results": suggest(prefix, limit)})
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def listings_facets(request):
+    spec = ListingSearchSpec.from_params(request.query_params)
+    if spec.errors:
+        raise ValidationError(spec.errors)
+    return Response(cached_facets(spec, request.query_params))
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def search_cache_stats(request):
+    return Response(cache_stats())
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.listings.search_cache import invalidate_listing_search
+from apps.listings.services import apply_review_delta, recompute_listing_ratings
+
+from .models import Review
+
+
+@receiver(post_save, sender=Review)
+def update_listing_rating_on_save(sender, instance: Review, created: bool, **kwargs):
+    if created:
+        apply_review_delta(instance.listing_id, instance.rating, 1)
+    else:
+        recompute_listing_ratings([instance.listing_id])
+    invalidate_listing_search(instance.listing_id)
+
+
+@receiver(post_delete, sender=Review)
+def update_listing_rating_on_delete(sender, instance: Review, **kwargs):
+    apply_review_delta(instance.listing_id, -instance.rating, -1)
+    invalidate_listing_search(instance.listing_id)
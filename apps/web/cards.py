@@ -0,0 +1,35 @@
+"""Cached rendering of ``partials/listing_card.html``.
+
+A card depends only on its listing, so the rendered HTML is cached per
+listing under a key that includes ``Listing.cache_version``. The version is
+bumped on every listing save, image change and rating update, so a changed
+listing simply gets a new key and the old fragment expires. A page of cards
+is one ``get_many``; only the misses are rendered and stored with
+``set_many``.
+"""
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = "web/partials/listing_card.html"
+CARD_CACHE_TTL = 24 * 3600
+
+
+def card_cache_key(listing) -> str:
+    return f"listing:card:{listing.pk}:{listing.cache_version}"
+
+
+def render_listing_cards(listings) -> str:
+    listings = list(listings)
+    keys = [card_cache_key(listing) for listing in listings]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    for listing, key in zip(listings, keys):
+        if key not in cached and key not in missing:
+            missing[key] = render_to_string(CARD_TEMPLATE, {"listing": listing})
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TTL)
+        cached.update(missing)
+    return mark_safe("".join(cached[key] for key in keys))
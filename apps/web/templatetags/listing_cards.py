@@ -0,0 +1,10 @@
+from django import template
+
+from apps.web.cards import render_listing_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def listing_cards(listings):
+    return render_listing_cards(listings)
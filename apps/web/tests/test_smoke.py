@@ -12,3 +12,121 @@ def test_home_page(client):
 def test_api_schema(client):
     response = client.get("/api/schema/")
     assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_listing_cards_use_prefetched_images(client, django_assert_num_queries):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from apps.listings import home_sections
+    from apps.listings.models import Listing, ListingImage
+    from apps.listings.services import base_listing_queryset
+
+    owner = get_user_model().objects.create_user(email="o@t.com", username="o", password="x", role="landlord")
+
+    def add_listings(n):
+        for i in range(n):
+            listing = Listing.objects.create(owner=owner, title=f"flat {i}", description="d", city="Berlin",
+                                             price=10, rooms=1, housing_type="apartment")
+            ListingImage.objects.create(listing=listing, image=f"listings/{listing.pk}-a.jpg", order=0)
+            ListingImage.objects.create(listing=listing, image=f"listings/{listing.pk}-b.jpg", order=1,
+                                        is_primary=True)
+
+    def home_queries():
+        # Rebuild the sections so the cards just added are rendered.
+        home_sections.refresh_home_sections()
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse("web:home"))
+        assert response.status_code == 200
+        return len(response.context["popular_listings"]), len(ctx)
+
+    add_listings(1)
+    cards, queries = home_queries()
+    assert cards == 1
+    add_listings(5)
+    assert home_queries() == (6, queries)
+
+    listing = base_listing_queryset().first()
+    with django_assert_num_queries(0):
+        assert listing.primary_image.image.name.endswith("-b.jpg")
+    assert Listing.objects.get(pk=listing.pk).primary_image.image.name.endswith("-b.jpg")
+
+
+@pytest.mark.django_db
+def test_home_sections_served_stale_while_refreshing(client, monkeypatch):
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+
+    from apps.listings import home_sections
+    from apps.listings.models import Listing
+
+    cache.delete_many([home_sections.CACHE_KEY, home_sections.REFRESH_LOCK_KEY])
+    owner = get_user_model().objects.create_user(email="h@t.com", username="h", password="x", role="landlord")
+    old = Listing.objects.create(owner=owner, title="old", description="d", city="Berlin", price=10, rooms=1,
+                                 housing_type="apartment")
+
+    # Tests run Celery eagerly, so a cold cache is filled on the first request.
+    response = client.get(reverse("web:home"))
+    assert [x.pk for x in response.context["new_listings"]] == [old.pk]
+
+    new = Listing.objects.create(owner=owner, title="new", description="d", city="Berlin", price=10, rooms=1,
+                                 housing_type="apartment")
+    assert [x.pk for x in client.get(reverse("web:home")).context["new_listings"]] == [old.pk]
+
+    queued = []
+    built_at = cache.get(home_sections.CACHE_KEY)["built_at"]
+    monkeypatch.setattr(home_sections, "_now", lambda: built_at + home_sections.HOME_SECTIONS_TTL + 1)
+    monkeypatch.setattr("apps.listings.tasks.refresh_home_page_sections.delay", lambda: queued.append(1))
+    for _ in range(2):
+        assert [x.pk for x in client.get(reverse("web:home")).context["new_listings"]] == [old.pk]
+    assert queued == [1]
+
+    home_sections.refresh_home_sections()
+    assert [x.pk for x in client.get(reverse("web:home")).context["new_listings"]] == [new.pk, old.pk]
+
+
+@pytest.mark.django_db
+def test_listing_cards_cached_per_version(django_assert_num_queries):
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+
+    from apps.listings.models import Listing, ListingImage
+    from apps.listings.services import apply_review_delta, base_listing_queryset
+    from apps.web.cards import card_cache_key, render_listing_cards
+
+    owner = get_user_model().objects.create_user(email="c@t.com", username="c", password="x", role="landlord")
+    first, second = (
+        Listing.objects.create(owner=owner, title=title, description="d", city="Berlin", price=10, rooms=1,
+                               housing_type="apartment")
+        for title in ("first card", "second card")
+    )
+    cache.delete_many([card_cache_key(first), card_cache_key(second)])
+
+    html = render_listing_cards(base_listing_queryset().order_by("id"))
+    assert html.index("first card") < html.index("second card")
+
+    listings = list(base_listing_queryset().order_by("id"))
+    with django_assert_num_queries(0):
+        assert render_listing_cards(listings) == html
+
+    versions = [first.cache_version]
+    first.title = "renamed card"
+    first.save()
+    versions.append(Listing.objects.get(pk=first.pk).cache_version)
+    ListingImage.objects.create(listing=first, image="listings/first.jpg")
+    versions.append(Listing.objects.get(pk=first.pk).cache_version)
+    apply_review_delta(first.pk, 5, 1)
+    versions.append(Listing.objects.get(pk=first.pk).cache_version)
+    assert versions == sorted(set(versions))
+
+    # A review landing while an edit is open must not leave both under one version.
+    stale = Listing.objects.get(pk=first.pk)
+    apply_review_delta(first.pk, 4, 1)
+    reviewed = Listing.objects.get(pk=first.pk).cache_version
+    stale.save()
+    assert stale.cache_version == reviewed + 1 == Listing.objects.get(pk=first.pk).cache_version
+
+    html = render_listing_cards(base_listing_queryset().order_by("id"))
+    assert "renamed card" in html and "second card" in html
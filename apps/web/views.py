@@ -1,3 +1,5 @@
+import logging
+
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
@@ -5,8 +7,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.conf import settings
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Avg, Count, Q
-from django.db.models.functions import Coalesce
+from django.db.models import Q
+from django.core.exceptions import BadRequest
 from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
@@ -37,7 +39,14 @@ from apps.bookings.tasks import (
 )
 from apps.reviews.models import Review, TenantReview
 from apps.listings.models import Amenity, Favorite, Listing, ListingImage
-from apps.listings.tasks import save_listing_view_event, track_listing_view
+from apps.listings.pagination import InvalidCursor, keyset_page, resolve_sort, wants_keyset
+from apps.listings.facets import cached_facets
+from apps.listings.home_sections import get_home_sections
+from apps.listings.search import ListingSearchSpec
+from apps.listings.search_cache import CachedSearchResults
+from apps.listings.search_log import visitor_id
+from apps.listings.view_counter import record_listing_view
+from apps.listings.view_events import record_view_event
 from apps.users.models import User
 
 from .forms import (
@@ -56,6 +65,8 @@ from .utils import (
     validate_uploaded_images,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class HomeView(TemplateView):
     template_name = "web/home.html"
@@ -63,8 +74,11 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx["search_form"] = SearchForm(self.request.GET or None)
-        ctx["popular_listings"] = base_listing_queryset().order_by("-reviews_count")[:8]
-        ctx["amenities"] = Amenity.objects.all()[:12]
+        sections = get_home_sections(base_listing_queryset())
+        ctx["popular_listings"] = sections["popular"]
+        ctx["new_listings"] = sections["new"]
+        ctx["trending_listings"] = sections["trending"]
+        ctx["amenities"] = sections["amenities"]
         return ctx
 
 
@@ -73,15 +87,63 @@ class ListingSearchView(ListView):
     context_object_name = "listings"
     paginate_by = 12
 
+    keyset_sorts = {"reviews_desc", "price_asc", "price_desc", "rating_desc", "date_new", "trending"}
+    next_cursor = None
+
+    def _keyset_mode(self):
+        return wants_keyset(self.request.GET)
+
+    def get_paginate_by(self, queryset):
+        if self._keyset_mode():
+            return None
+        return super().get_paginate_by(queryset)
+
     def get_queryset(self):
-        qs = base_listing_queryset()
-        return filter_listings(qs, self.request.GET, user=self.request.user)
+        qs = filter_listings(
+            base_listing_queryset(),
+            self.request.GET,
+            user=self.request.user,
+            visitor=visitor_id(self.request),
+        )
+        if self._keyset_mode():
+            sort = resolve_sort(self.request.GET.get("sort", "popular"), self.keyset_sorts)
+            try:
+                listings, self.next_cursor = keyset_page(
+                    qs, sort, self.request.GET.get("cursor") or None, self.paginate_by
+                )
+            except InvalidCursor:
+                raise BadRequest("Некорректный курсор")
+            return listings
+        return CachedSearchResults(qs, base_listing_queryset(), "web_search", self.request.GET)
+
+    def get_template_names(self):
+        if self._keyset_mode() and self.request.headers.get("x-requested-with") == "XMLHttpRequest":
+            return ["web/partials/listing_cards_page.html"]
+        return super().get_template_names()
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx["search_form"] = SearchForm(self.request.GET)
-        ctx["amenities"] = Amenity.objects.all()
-        ctx["housing_types"] = Listing.HousingType.choices
+        facets = cached_facets(
+            ListingSearchSpec.from_params(self.request.GET, default_sort="popular"), self.request.GET
+        )
+        amenity_counts = {a["id"]: a["count"] for a in facets["amenities"]}
+        amenities = list(Amenity.objects.all())
+        for amenity in amenities:
+            amenity.facet_count = amenity_counts.get(amenity.id, 0)
+        ctx["amenities"] = amenities
+        ctx["housing_types"] = [(h["value"], h["label"], h["count"]) for h in facets["housing_type"]]
+        ctx["facets"] = facets
+        ctx["currencies"] = Listing.Currency.choices
+        ctx["display_currency"] = (
+            self.request.GET.get("display_currency") or settings.LISTING_BASE_CURRENCY
+        ).upper()
+        ctx["keyset_mode"] = self._keyset_mode()
+        if self.next_cursor:
+            params = self.request.GET.copy()
+            params.pop("page", None)
+            params["cursor"] = self.next_cursor
+            ctx["next_query"] = params.urlencode()
         return ctx
 
 
@@ -96,13 +158,9 @@ class ListingDetailView(DetailView):
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
         user = self.request.user
-        user_id = user.id if user.is_authenticated else None
-        try:
-            track_listing_view.delay(obj.id, user_id, obj.owner_id)
-            if user.is_authenticated:
-                save_listing_view_event.delay(obj.id, user.id)
-        except Exception:
-            pass
+        record_listing_view(obj.id, obj.owner_id, user, visitor_id(self.request))
+        if user.is_authenticated:
+            record_view_event(obj.id, user.id)
         return obj
 
     def get_context_data(self, **kwargs):
@@ -559,10 +617,6 @@ def my_listings(request):
     listings = (
         Listing.all_objects.filter(owner=request.user, is_deleted=False)
         .prefetch_related("images")
-        .annotate(
-            avg_rating=Coalesce(Avg("reviews__rating"), 0.0),
-            reviews_count=Count("reviews", distinct=True),
-        )
         .order_by("-created_at")
     )
     return render(request, "web/account/listings.html", {"listings": listings})
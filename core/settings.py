@@ -16,6 +16,30 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.listings.tasks.flush_listing_views_to_db",
         "schedule": crontab(minute="*/1"),
     },
+    "flush-search-queries-every-minute": {
+        "task": "apps.listings.tasks.flush_search_queries_to_db",
+        "schedule": crontab(minute="*/1"),
+    },
+    "ingest-listing-view-events-every-minute": {
+        "task": "apps.listings.tasks.ingest_listing_view_events",
+        "schedule": crontab(minute="*/1"),
+    },
+    "refresh-home-sections-every-minute": {
+        "task": "apps.listings.tasks.refresh_home_page_sections",
+        "schedule": crontab(minute="*/1"),
+    },
+    "fold-listing-daily-stats-nightly": {
+        "task": "apps.listings.tasks.fold_listing_daily_stats",
+        "schedule": crontab(hour=0, minute=20),
+    },
+    "rebuild-listing-neighbors-nightly": {
+        "task": "apps.listings.tasks.rebuild_listing_neighbors",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    "purge-listing-view-events-daily": {
+        "task": "apps.listings.tasks.purge_listing_view_events",
+        "schedule": crontab(hour=3, minute=30),
+    },
     "complete-past-bookings-daily": {
         "task": "apps.bookings.tasks.complete_past_bookings",
         "schedule": crontab(hour=3, minute=0),
@@ -217,6 +241,13 @@ ADMINS = [("Admin", EMAIL_HOST_USER)]
 
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+# Pool of apps/common/redis_client.py (counters, buffers, streams), per process.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# Bearer token for /metrics/ (staff sessions may always read it).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", REDIS_URL)
@@ -244,6 +275,14 @@ if SENTRY_DSN:
 LISTING_IMAGE_MAX_SIZE_MB = int(os.getenv("LISTING_IMAGE_MAX_SIZE_MB", "5"))
 LISTING_IMAGE_MAX_COUNT = int(os.getenv("LISTING_IMAGE_MAX_COUNT", "10"))
 
+# auto | fulltext | icontains — see apps/listings/search_index.py
+LISTING_SEARCH_BACKEND = os.getenv("LISTING_SEARCH_BACKEND", "auto")
+LISTING_SEARCH_CACHE_TTL = int(os.getenv("LISTING_SEARCH_CACHE_TTL", "300"))
+# ListingViewEvent rows older than this are deleted nightly.
+LISTING_VIEW_EVENTS_RETENTION_DAYS = int(os.getenv("LISTING_VIEW_EVENTS_RETENTION_DAYS", "180"))
+LISTING_BASE_CURRENCY = os.getenv("LISTING_BASE_CURRENCY", "EUR")
+FX_RATES_FILE = os.getenv("FX_RATES_FILE", str(BASE_DIR / "apps" / "listings" / "data" / "fx_rates.json"))
+
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=360),
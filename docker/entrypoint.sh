@@ -3,4 +3,5 @@ set -e
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput
 python manage.py load_amenities
+python manage.py load_fx_rates
 exec "$@"